@@ -3,8 +3,10 @@ The `brent.common` module contains common functions that can be
 used while working with dataframes and brent graphs. They are also
 used internally by the library.
 """
+import os
 import logging
 from itertools import islice
+from collections import OrderedDict
 
 import numpy as np
 import pandas as pd
@@ -36,6 +38,102 @@ def make_fake_df(nodes=6, rows=100, values=2, seed=42):
     return pd.DataFrame({k: np.random.randint(0, values, rows) for k in letters[:nodes]})
 
 
+def read_chunks(path, chunksize=100000, columns=None):
+    """
+    Reads a dataset from disk in chunks such that it never needs to fit in memory.
+    This is meant to be used together with `brent.DAG.from_chunks`. The following
+    formats are supported:
+
+    - a directory with one `.npy` file per column, these are memory-mapped
+    - a `.parquet` file, this requires `pyarrow` to be installed
+    - anything else is read as a `.csv` file
+
+    ## Inputs
+
+    - **path**: path to a file or directory
+    - **chunksize**: the number of rows per chunk
+    - **columns**: the columns to read, defaults to all of them
+
+    ## Example
+
+    ```
+    from brent import DAG
+    from brent.common import read_chunks
+
+    dag = DAG.from_chunks(read_chunks("data/drinking.csv"), edges=[])
+    ```
+    """
+    if os.path.isdir(path):
+        files = sorted(f for f in os.listdir(path) if f.endswith(".npy"))
+        arrays = {f[:-4]: np.load(os.path.join(path, f), mmap_mode="r") for f in files}
+        arrays = {k: v for k, v in arrays.items() if (columns is None) or (k in columns)}
+        n_rows = min(len(v) for v in arrays.values())
+        for start in range(0, n_rows, chunksize):
+            yield pd.DataFrame({k: np.asarray(v[start:start + chunksize]) for k, v in arrays.items()})
+    elif path.endswith(".parquet"):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("reading parquet files in chunks requires `pyarrow`, try `pip install pyarrow`")
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunksize, usecols=columns)
+
+
+class LRUCache:
+    """
+    A size-bounded cache that forgets the least recently used item first.
+    It keeps track of hits and misses such that you can check how useful it is.
+
+    ## Example
+
+    ```
+    from brent.common import LRUCache
+
+    cache = LRUCache(maxsize=2)
+    cache.put("a", 1)
+    cache.get("a") # 1
+    cache.info() # {'hits': 1, 'misses': 0, 'maxsize': 2, 'currsize': 1}
+    ```
+    """
+    def __init__(self, maxsize=128):
+        if maxsize < 1:
+            raise ValueError("`maxsize` needs to be at least 1")
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, key, default=None):
+        """Fetches an item and marks it as recently used, returns `default` if it is missing."""
+        if key not in self._items:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self._items.move_to_end(key)
+        return self._items[key]
+
+    def put(self, key, value):
+        """Stores an item, if the cache is full the least recently used item is removed."""
+        self._items[key] = value
+        self._items.move_to_end(key)
+        if len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def clear(self):
+        """Removes all items and resets the statistics."""
+        self._items.clear()
+        self.hits, self.misses = 0, 0
+
+    def info(self):
+        """Returns the hits, misses, maximum size and current size of the cache."""
+        return {"hits": self.hits, "misses": self.misses, "maxsize": self.maxsize, "currsize": len(self)}
+
+
 def normalise(x):
     """
     Simply normalises a numpy-like array or pandas-series.
@@ -6,6 +6,11 @@ Don't forget to see the docstring for a reference to the origin of the
 dataset.
 """
 
+import os
+import json
+import shutil
+import hashlib
+import logging
 import itertools as it
 from functools import reduce
 
@@ -13,6 +18,94 @@ import pandas as pd
 import numpy as np
 
 
+SOURCES = {
+    "asia": "http://www.ccd.pitt.edu/wiki/images/ASIA10k.csv",
+    "alarm": "http://www.ccd.pitt.edu/wiki/images/ALARM10k.csv",
+    "child": "http://www.ccd.pitt.edu/wiki/images/CHILD10k.csv",
+}
+
+
+def get_data_home():
+    """
+    Returns the directory where downloaded datasets are cached. This is the
+    `BRENT_DATA` environment variable if it is set and `~/brent_data` otherwise.
+    The directory is created if it does not exist yet.
+    """
+    path = os.path.expanduser(os.environ.get("BRENT_DATA", os.path.join("~", "brent_data")))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def clear_data_home():
+    """Removes all the datasets that are cached in `get_data_home()`."""
+    shutil.rmtree(get_data_home())
+
+
+def register_dataset(name, source):
+    """
+    Sets the source of a dataset, this can be a url or a path to a local `.csv`
+    file. This is useful in environments without internet access. The cached copy
+    of the dataset is refreshed the next time it is loaded.
+
+    ## Inputs
+
+    - **name**: name of the dataset, one of `asia`, `alarm` or `child`
+    - **source**: url or path of a `.csv` file
+
+    ## Example
+
+    ```
+    from brent.datasets import register_dataset, alarm_dataset
+
+    register_dataset("alarm", "/data/ALARM10k.csv")
+    alarm_dataset()
+    ```
+    """
+    if name not in SOURCES:
+        raise ValueError(f"unknown dataset {name}, choose from {list(SOURCES.keys())}")
+    SOURCES[name] = source
+
+
+def _checksum(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_dataset(name):
+    """
+    Loads a dataset via the cache in `get_data_home()`. The first time the dataset is
+    read from its source and stored as a pickle with categorical columns, together
+    with its source and a sha256 checksum. Later calls read the pickle, unless the
+    checksum does not match or the source changed, then the source is read again.
+    For a local source the checksum of the `.csv` file is stored as well, so an
+    edited file is read again. If the local file is gone the cached copy is used.
+
+    ## Inputs
+
+    - **name**: name of the dataset, one of `asia`, `alarm` or `child`
+    """
+    if name not in SOURCES:
+        raise ValueError(f"unknown dataset {name}, choose from {list(SOURCES.keys())}")
+    path = os.path.join(get_data_home(), f"{name}.pkl")
+    meta_path = os.path.join(get_data_home(), f"{name}.json")
+    source_sha256 = _checksum(SOURCES[name]) if os.path.isfile(SOURCES[name]) else None
+    if os.path.exists(path) and os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+        unchanged = source_sha256 is None or meta.get("source_sha256") == source_sha256
+        if meta["source"] == SOURCES[name] and meta["sha256"] == _checksum(path) and unchanged:
+            return pd.read_pickle(path)
+        logging.debug(f"cached copy of {name} is outdated or corrupt, reading {SOURCES[name]}")
+    df = pd.read_csv(SOURCES[name]).astype("category")
+    df.to_pickle(path)
+    with open(meta_path, "w") as f:
+        json.dump({"source": SOURCES[name], "sha256": _checksum(path), "source_sha256": source_sha256}, f)
+    return df
+
+
 def simple_study_dataset():
     """
     Creates a simple dataset that simulates the probability of passing
@@ -53,6 +146,7 @@ def asian_cancer_dataset():
     that has orignally also been featured in the `bnlearn` package. It
     is simulated data but has been used historically in benchmarks.
 
+    The dataset is downloaded once and cached afterwards, see `load_dataset`.
     The original description to the dataset can be found here:
     http://www.bnlearn.com/bnrepository/discrete-small.html#cancer
 
@@ -63,7 +157,7 @@ def asian_cancer_dataset():
     Journal of the Royal Statistical Society: Series B (Statistical Methodology),
     50(2):157-224, 1988.
     """
-    return pd.read_csv("http://www.ccd.pitt.edu/wiki/images/ASIA10k.csv")
+    return load_dataset("asia")
 
 
 def alarm_dataset():
@@ -73,6 +167,7 @@ def alarm_dataset():
     It is a dataset that has orignally also been featured in the `bnlearn` package.
     It is simulated data but has been used historically in benchmarks.
 
+    The dataset is downloaded once and cached afterwards, see `load_dataset`.
     The original description to the dataset can be found here:
     http://www.bnlearn.com/bnrepository/discrete-medium.html#alarm
 
@@ -82,7 +177,7 @@ def alarm_dataset():
     Techniques for Belief Networks. In Proceedings of the 2nd European Conference
     on Artificial Intelligence in Medicine, pages 247-256. Springer-Verlag, 1989.
     """
-    return pd.read_csv("http://www.ccd.pitt.edu/wiki/images/ALARM10k.csv")
+    return load_dataset("alarm")
 
 
 def blue_baby_dataset():
@@ -92,6 +187,7 @@ def blue_baby_dataset():
     It is a dataset that has orignally also been featured in the `bnlearn` package.
     It is simulated data but has been used historically in benchmarks.
 
+    The dataset is downloaded once and cached afterwards, see `load_dataset`.
     The original description to the dataset can be found here:
     http://www.bnlearn.com/bnrepository/discrete-medium.html#child
 
@@ -100,7 +196,7 @@ def blue_baby_dataset():
     In Bayesian Statistics 4 (J. M. Bernardo, J. 0. Berger, A. P. Dawid and A. F. M.
     Smith, eds.) 447-466. Clarendon Press, Oxford.
     """
-    return pd.read_csv("http://www.ccd.pitt.edu/wiki/images/CHILD10k.csv")
+    return load_dataset("child")
 
 
 def earthquake_dataset():
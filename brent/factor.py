@@ -0,0 +1,192 @@
+"""
+The `brent.factor` module contains the `Factor` object. A factor is a dense
+representation of a probability table; every variable gets an axis in a
+numpy array and every value of a variable gets an integer code along that
+axis. Multiplying factors becomes broadcasting instead of joining dataframes.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+class Factor:
+    """
+    A `Factor` describes a (conditional) probability table as an n-dimensional
+    numpy array. The axes of the array follow the order of `variables` and
+    the position along an axis follows the order of the values in `domains`.
+
+    ```
+    from brent import DAG
+    from brent.factor import Factor
+    from brent.common import make_fake_df
+
+    dag = DAG(make_fake_df(4)).add_edge("a", "b")
+    factor = Factor.from_frame(dag.calc_node_table("b"))
+    factor.marginalise(["a"]).to_frame()
+    ```
+    """
+    def __init__(self, variables, domains, values):
+        """
+        Create a new factor.
+
+        ## Inputs
+
+        - **variables**: the names of the variables, one per axis of `values`
+        - **domains**: dictionary that maps each variable to the values it can take
+        - **values**: array with shape `(len(domains[v]) for v in variables)`
+        """
+        self.variables = tuple(variables)
+        self.domains = {v: tuple(domains[v]) for v in self.variables}
+        self.values = np.asarray(values, dtype=float)
+        if self.values.shape != self.shape:
+            raise ValueError(f"values have shape {self.values.shape} but domains imply {self.shape}")
+
+    def __repr__(self):
+        return f"Factor(variables={self.variables}, shape={self.shape})"
+
+    def __mul__(self, other):
+        return self.product(other)
+
+    @property
+    def shape(self):
+        """The shape of the array that belongs to this factor."""
+        return tuple(len(self.domains[v]) for v in self.variables)
+
+    @classmethod
+    def from_frame(cls, frame, domains=None, value_col="prob"):
+        """
+        Create a factor from a probability table in dataframe form. Combinations
+        that do not occur in the dataframe get a value of zero.
+
+        ## Inputs
+
+        - **frame**: dataframe with one column per variable and a column with values
+        - **domains**: dictionary of the values each variable can take, if not given
+                       these are inferred from the dataframe
+        - **value_col**: the name of the column that contains the values, defaults to `prob`
+        """
+        variables = [c for c in frame.columns if c != value_col]
+        if domains is None:
+            domains = {v: pd.Categorical(frame[v]).categories for v in variables}
+        domains = {v: tuple(domains[v]) for v in variables}
+        codes = []
+        for v in variables:
+            code = pd.Categorical(frame[v], categories=domains[v]).codes
+            if (code < 0).any():
+                raise ValueError(f"column {v} contains values that are not in its domain")
+            codes.append(code)
+        values = np.zeros(tuple(len(domains[v]) for v in variables))
+        np.add.at(values, tuple(codes), frame[value_col].values)
+        return cls(variables, domains, values)
+
+    def to_frame(self, drop_zeros=False, value_col="prob"):
+        """
+        Turn the factor back into a dataframe with one row per combination of values.
+
+        ## Inputs
+
+        - **drop_zeros**: only keep the rows with a non-zero value, defaults to `False`
+        - **value_col**: the name of the column that will contain the values
+        """
+        if len(self.variables) == 0:
+            return pd.DataFrame({value_col: [float(self.values)]})
+        index = pd.MultiIndex.from_product([self.domains[v] for v in self.variables], names=self.variables)
+        frame = index.to_frame(index=False).assign(**{value_col: self.values.ravel()})
+        if drop_zeros:
+            frame = frame.loc[lambda d: d[value_col] != 0].reset_index(drop=True)
+        return frame
+
+    def _aligned(self, variables):
+        """Returns the values transposed and reshaped such that they broadcast against `variables`."""
+        order = [self.variables.index(v) for v in variables if v in self.variables]
+        shape = [len(self.domains[v]) if v in self.variables else 1 for v in variables]
+        return self.values.transpose(order).reshape(shape)
+
+    def transpose(self, variables):
+        """Returns the same factor with the axes in the order of `variables`."""
+        if set(variables) != set(self.variables):
+            raise ValueError(f"{variables} is not a permutation of {self.variables}")
+        return Factor(variables, self.domains, self._aligned(variables))
+
+    def reindex(self, domains):
+        """
+        Returns the factor with its domains replaced by `domains`. The new
+        domains need to contain all the old values, values that are new
+        get a value of zero.
+
+        ## Inputs
+
+        - **domains**: dictionary that maps variables to their new values
+        """
+        new_domains = {v: tuple(domains.get(v, self.domains[v])) for v in self.variables}
+        positions = []
+        for v in self.variables:
+            position = pd.Index(new_domains[v]).get_indexer(self.domains[v])
+            if (position < 0).any():
+                raise ValueError(f"new domain of {v} does not contain all of {self.domains[v]}")
+            positions.append(position)
+        values = np.zeros(tuple(len(new_domains[v]) for v in self.variables))
+        values[np.ix_(*positions)] = self.values
+        return Factor(self.variables, new_domains, values)
+
+    def product(self, other):
+        """
+        Multiply two factors. The result has all variables of both factors,
+        the values are calculated via broadcasting.
+        """
+        variables = self.variables + tuple(v for v in other.variables if v not in self.variables)
+        for v in set(self.variables).intersection(other.variables):
+            if len(self.domains[v]) != len(other.domains[v]):
+                raise ValueError(f"variable {v} has a different domain in both factors")
+        domains = {**other.domains, **self.domains}
+        return Factor(variables, domains, self._aligned(variables) * other._aligned(variables))
+
+    def marginalise(self, variables):
+        """
+        Sum out variables.
+
+        ## Inputs
+
+        - **variables**: the variables to remove from the factor
+        """
+        axes = tuple(i for i, v in enumerate(self.variables) if v in variables)
+        remaining = [v for v in self.variables if v not in variables]
+        return Factor(remaining, self.domains, self.values.sum(axis=axes))
+
+    def reduce(self, evidence):
+        """
+        Only keep the part of the factor that agrees with the evidence. The
+        observed variables are removed from the factor.
+
+        ## Inputs
+
+        - **evidence**: dictionary of variable-value pairs that are observed
+        """
+        index = []
+        for v in self.variables:
+            if v not in evidence:
+                index.append(slice(None))
+            elif evidence[v] in self.domains[v]:
+                index.append(self.domains[v].index(evidence[v]))
+            else:
+                raise ValueError(f"value {evidence[v]} does not occur for variable {v}")
+        remaining = [v for v in self.variables if v not in evidence]
+        return Factor(remaining, self.domains, self.values[tuple(index)])
+
+    def normalise(self, variables=None):
+        """
+        Normalise the values of the factor. If `variables` is given the factor
+        is normalised over these variables only, which turns a joint table into
+        a conditional one. Combinations that sum to zero remain zero.
+
+        ## Inputs
+
+        - **variables**: the variables to normalise over, defaults to all of them
+        """
+        if variables is None:
+            variables = self.variables
+        axes = tuple(i for i, v in enumerate(self.variables) if v in variables)
+        total = self.values.sum(axis=axes, keepdims=True)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            values = np.where(total > 0, self.values / total, 0.0)
+        return Factor(self.variables, self.domains, values)
@@ -3,14 +3,27 @@ The `brent.graph` module contains the DAG object. This is the
 main object that you'll talk to when constructing a casual graph.
 """
 
+import os
+import json
 import logging
+import itertools as it
 
 import numpy as np
 import pandas as pd
 import networkx as nx
 from graphviz import Digraph
 
-from brent.common import normalise, window, is_path_blocked
+from brent.common import normalise, window, is_path_blocked, LRUCache
+from brent.factor import Factor
+from brent.inference import JunctionTree, indicator
+from brent.parsers import bif_factors
+
+_TOKENS = it.count()
+
+
+def _to_json(value):
+    """Turns numpy scalars into python values such that they can be written as json."""
+    return value.item() if isinstance(value, np.generic) else value
 
 
 class DAG:
@@ -51,6 +64,224 @@ class DAG:
             self.graph.add_node(node)
         self.cached = False
         self.prob_tables = {}
+        self.factors = {}
+        self.counts = {}
+        self._domains = None
+        self._index = None
+        self._codes = None
+        self._batches = []
+        self.junction_tree = None
+        self.query_cache = None
+        self._version = 0
+        self._token = next(_TOKENS)
+        self._encode()
+
+    @classmethod
+    def from_chunks(cls, chunks, edges=()):
+        """
+        Create a DAG from an iterable of dataframes, for example the output of
+        `pd.read_csv(path, chunksize=...)` or `brent.common.read_chunks`. The chunks
+        are counted one at a time via `DAG.partial_fit` and are never kept in
+        memory, so `dag.df` is `None` for a DAG that is made this way. Because
+        the counts depend on the parents of every node, the edges need to be
+        known up front and the DAG is cached.
+
+        ## Inputs
+
+        - **chunks**: iterable of dataframes that all contain the same columns
+        - **edges**: iterable of `(source, sink)` tuples
+
+        ## Example
+
+        ```
+        from brent import DAG
+        from brent.common import make_fake_df
+
+        chunks = (make_fake_df(4, rows=1000, seed=i) for i in range(10))
+        dag = DAG.from_chunks(chunks, edges=[("a", "b"), ("b", "c"), ("c", "d")])
+        ```
+        """
+        chunks = iter(chunks)
+        first = next(chunks, None)
+        if first is None:
+            raise ValueError("`chunks` did not contain any data")
+        dag = cls(first.iloc[:0]).add_edges(edges).cache()
+        dag.df = None
+        for chunk in it.chain([first], chunks):
+            dag.partial_fit(chunk)
+        return dag
+
+    @classmethod
+    def from_bif(cls, path):
+        """
+        Create a DAG from a file in the Bayesian Interchange Format (bif). The
+        probability tables of the file are used as they are, there is no dataframe
+        involved, so `dag.df` is `None` for a DAG that is made this way. The values
+        of every node keep the order in which they are declared in the file.
+
+        ## Inputs
+
+        - **path**: path to a bif file or an open file
+
+        ## Example
+
+        ```
+        from brent import DAG, Query
+
+        dag = DAG.from_bif("alarm.bif")
+        Query(dag).given(HR="HIGH").infer()
+        ```
+        """
+        if isinstance(path, str):
+            with open(path) as f:
+                factors, edges = bif_factors(f)
+        else:
+            factors, edges = bif_factors(path)
+        return cls.from_cpts(edges, factors)
+
+    @classmethod
+    def from_cpts(cls, edges, cpts, domains=None):
+        """
+        Create a DAG from conditional probability tables instead of data. This is
+        useful for models that are specified by experts or that are learned elsewhere.
+        There is no dataframe involved, so `dag.df` is `None` for a DAG that is made this
+        way and the probability tables stay fixed; every query uses them as they are.
+
+        ## Inputs
+
+        - **edges**: iterable of `(source, sink)` tuples
+        - **cpts**: dictionary that maps every node to its probability table, either as a
+                    dataframe with a column per parent, a column for the node and a `prob`
+                    column or as a `brent.factor.Factor`
+        - **domains**: dictionary with the values that every node can take, if it is not
+                       given the values are taken from the probability tables
+
+        ## Example
+
+        ```
+        import pandas as pd
+        from brent import DAG, Query
+
+        rain = pd.DataFrame({"rain": [0, 1], "prob": [0.8, 0.2]})
+        wet = pd.DataFrame({"rain": [0, 0, 1, 1], "wet": [0, 1, 0, 1], "prob": [0.9, 0.1, 0.2, 0.8]})
+        dag = DAG.from_cpts(edges=[("rain", "wet")], cpts={"rain": rain, "wet": wet})
+        Query(dag).given(wet=1).infer()
+        ```
+        """
+        nodes = list(cpts.keys())
+        dag = cls(pd.DataFrame(columns=nodes))
+        dag.df = None
+        dag.add_edges(edges)
+        for node, cpt in cpts.items():
+            if not isinstance(cpt, Factor) and "prob" not in cpt.columns:
+                raise ValueError(f"probability table of {node} has no `prob` column")
+            variables = cpt.variables if isinstance(cpt, Factor) else [c for c in cpt.columns if c != "prob"]
+            if set(variables) != dag.parents(node).union({node}):
+                raise ValueError(f"probability table of {node} has variables {tuple(variables)} "
+                                 f"but the node has parents {dag.parents(node)}")
+        if domains is None:
+            domains = {}
+            for node, cpt in cpts.items():
+                values = cpt.domains[node] if isinstance(cpt, Factor) else pd.Categorical(cpt[node]).categories
+                domains[node] = tuple(values)
+        missing = [n for n in nodes if n not in domains]
+        if missing:
+            raise ValueError(f"no domain given for nodes {missing}")
+        dag._domains = {n: tuple(domains[n]) for n in nodes}
+        dag._index = {n: {v: i for i, v in enumerate(d)} for n, d in dag._domains.items()}
+        dag._codes = None
+        for node, cpt in cpts.items():
+            factor = cpt if isinstance(cpt, Factor) else Factor.from_frame(cpt, domains=dag._domains)
+            factor = factor.reindex(dag._domains)
+            factor = factor.transpose([v for v in factor.variables if v != node] + [node])
+            if not np.allclose(factor.values.sum(axis=-1), 1.0, atol=0.01):
+                raise ValueError(f"probability table of {node} does not sum to one for every parent combination")
+            dag.factors[node] = factor
+            dag.prob_tables[node] = factor.to_frame(drop_zeros=True)
+        dag.cached = True
+        logging.debug(f"created DAG with {len(nodes)} nodes from probability tables")
+        return dag
+
+    def save(self, path):
+        """
+        Stores the fitted DAG in a directory without the dataframe. The structure and
+        the domains of the nodes are written to `structure.json`, the probability tables
+        and the counts of all nodes are concatenated into `factors.npy` and `counts.npy`
+        such that `DAG.load` can memory-map them.
+
+        ## Input
+
+        - **path**: the directory to write to, it is created if it does not exist
+
+        ## Example
+
+        ```
+        from brent import DAG
+        from brent.common import make_fake_df
+
+        dag = DAG(make_fake_df(4)).add_edge("a", "b").add_edge("b", "c").cache()
+        dag.save("model")
+        DAG.load("model")
+        ```
+        """
+        os.makedirs(path, exist_ok=True)
+        factors = [self.factor(n) for n in self.nodes]
+        has_counts = (self.df is not None) or all(n in self.counts for n in self.nodes)
+        structure = {
+            "format": 1,
+            "nodes": [_to_json(n) for n in self.nodes],
+            "edges": [[_to_json(a), _to_json(b)] for a, b in self.edges],
+            "domains": [[_to_json(v) for v in self.domains[n]] for n in self.nodes],
+            "variables": [[self.nodes.index(v) for v in f.variables] for f in factors],
+            "counts": has_counts,
+        }
+        with open(os.path.join(path, "structure.json"), "w") as f:
+            json.dump(structure, f)
+        np.save(os.path.join(path, "factors.npy"), np.concatenate([f.values.ravel() for f in factors]))
+        if has_counts:
+            counts = [self.family_counts(n).transpose(f.variables) for n, f in zip(self.nodes, factors)]
+            np.save(os.path.join(path, "counts.npy"), np.concatenate([c.values.ravel() for c in counts]))
+        return self
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        Loads a DAG that was stored via `DAG.save`. The loaded DAG is cached and has
+        no dataframe, just like a DAG from `DAG.from_chunks`. It can still be updated
+        via `DAG.partial_fit` if the counts were stored.
+
+        ## Input
+
+        - **path**: the directory that was written by `DAG.save`
+        - **mmap**: memory-map the tables instead of reading them into memory, this
+                    lets many processes share the same pages, defaults to `True`
+        """
+        with open(os.path.join(path, "structure.json")) as f:
+            structure = json.load(f)
+        if structure.get("format") != 1:
+            raise ValueError(f"{path} does not contain a DAG in a format that can be loaded")
+        nodes = structure["nodes"]
+        dag = cls(pd.DataFrame(columns=nodes))
+        dag.df = None
+        dag.graph.add_edges_from([tuple(e) for e in structure["edges"]])
+        dag._domains = {n: tuple(d) for n, d in zip(nodes, structure["domains"])}
+        dag._index = {n: {v: i for i, v in enumerate(d)} for n, d in dag._domains.items()}
+        dag._codes = None
+        tables = {"factors": np.load(os.path.join(path, "factors.npy"), mmap_mode="r" if mmap else None)}
+        if structure["counts"]:
+            tables["counts"] = np.load(os.path.join(path, "counts.npy"), mmap_mode="r" if mmap else None)
+        start = 0
+        for node, variables in zip(nodes, structure["variables"]):
+            variables = [nodes[i] for i in variables]
+            shape = tuple(len(dag._domains[v]) for v in variables)
+            stop = start + int(np.prod(shape))
+            dag.factors[node] = Factor(variables, dag._domains, tables["factors"][start:stop].reshape(shape))
+            if "counts" in tables:
+                dag.counts[node] = Factor(variables, dag._domains, tables["counts"][start:stop].reshape(shape))
+            start = stop
+        dag.cached = True
+        logging.debug(f"loaded DAG with {len(nodes)} nodes from {path}")
+        return dag
 
     @property
     def undirected_graph(self):
@@ -60,6 +291,60 @@ class DAG:
         """
         return self.graph.to_undirected()
 
+    @property
+    def domains(self):
+        """
+        Dictionary with the sorted values that each node can take. These
+        determine the integer codes that are used by `brent.factor.Factor`.
+        """
+        if self._domains is None:
+            self._encode()
+        return self._domains
+
+    @property
+    def domain_index(self):
+        """
+        Dictionary that maps every node to a dictionary from each of its values to
+        the integer code of that value. This allows for constant time lookups.
+        """
+        if self._index is None:
+            self._encode()
+        return self._index
+
+    def _encode(self):
+        """Integer-codes every column once, these codes are used for all counting."""
+        if len(self.df) == 0:
+            self._domains = {n: tuple() for n in self.df.columns}
+            self._index = {n: dict() for n in self.df.columns}
+            self._codes = {n: np.zeros(0, dtype=np.int8) for n in self.df.columns}
+            return
+        categoricals = {n: pd.Categorical(self.df[n]) for n in self.df.columns}
+        self._domains = {n: tuple(c.categories) for n, c in categoricals.items()}
+        self._index = {n: {v: i for i, v in enumerate(d)} for n, d in self._domains.items()}
+        self._codes = {n: c.codes for n, c in categoricals.items()}
+
+    def encode(self, name, values):
+        """
+        Translates values of a node into the integer codes of `DAG.domains`. Values
+        that do not occur in the domain, including missing values, get code -1.
+
+        ## Input
+
+        - **name**: Name of a node/variable in the graph
+        - **values**: array-like with values of the node
+
+        ## Example
+
+        ```
+        from brent import DAG
+        from brent.common import make_fake_df
+
+        dag = DAG(make_fake_df(4)).add_edge("a", "b")
+        dag.encode("a", [1, 0, 1]) # outputs array([1, 0, 1], dtype=int8)
+        ```
+        """
+        return pd.Categorical(values, categories=self.domains[name]).codes
+
     @property
     def origin_nodes(self):
         """These nodes are nodes that do not have any edges going in."""
@@ -69,7 +354,20 @@ class DAG:
     def marginal_table(self):
         """
         The marginal table is a table with all possible values and associated probability.
+        Note that this table grows exponentially with the number of nodes, queries use
+        `brent.inference.variable_elimination` instead. The table is stored if the
+        cache is enabled via `DAG.enable_cache()`.
         """
+        if self.query_cache is not None:
+            key = ("marginal_table", self.fingerprint)
+            table = self.query_cache.get(key)
+            if table is None:
+                table = self._marginal_table()
+                self.query_cache.put(key, table)
+            return table.copy()
+        return self._marginal_table()
+
+    def _marginal_table(self):
         nodes = list(self.graph.nodes)
         logging.debug(f"about to calculate marginal table with nodes {nodes}")
         logging.debug(f"updating table for node {nodes[-1]}")
@@ -83,6 +381,46 @@ class DAG:
             logging.debug(f"current marginal table:\n{marginal}")
         return marginal
 
+    @property
+    def fingerprint(self):
+        """
+        A hash that describes the structure and the data of the DAG. It changes when
+        edges are added, when the DAG is updated via `DAG.partial_fit` or when another
+        dataframe is assigned to `dag.df`. Changes made to the dataframe in place
+        are not detected. If the probability tables are stored, because the DAG is
+        cached or has no dataframe, every DAG object gets its own fingerprint since
+        two of them can hold different tables for the same structure.
+        """
+        data = id(self.df) if (self.df is not None) and (not self.cached) else self._token
+        return hash((tuple(self.nodes), tuple(sorted(self.edges, key=str)), data, self._version))
+
+    def enable_cache(self, maxsize=128):
+        """
+        Stores the results of `Query.infer` and `DAG.marginal_table` in a
+        `brent.common.LRUCache` such that repeated queries are answered from memory.
+        The queries are keyed by `DAG.fingerprint`, so results are invalidated
+        automatically when the DAG changes. The hit and miss statistics can be
+        found via `dag.query_cache.info()`.
+
+        ## Input
+
+        - **maxsize**: the maximum number of results to keep
+
+        ## Example
+
+        ```
+        from brent import DAG, Query
+        from brent.common import make_fake_df
+
+        dag = DAG(make_fake_df(4)).add_edge("a", "b").add_edge("b", "c").enable_cache()
+        Query(dag).given(a=1).infer()
+        Query(dag).given(a=1).infer()
+        dag.query_cache.info() # {'hits': 1, 'misses': 1, 'maxsize': 128, 'currsize': 1}
+        ```
+        """
+        self.query_cache = LRUCache(maxsize=maxsize)
+        return self
+
     @property
     def nodes(self):
         """The nodes of the graph."""
@@ -94,9 +432,71 @@ class DAG:
         return list(self.graph.edges)
 
     def copy(self):
-        """Returns a copy of the current DAG."""
-        new_dag = DAG(self.df)
+        """
+        Returns a copy of the current DAG. The dataframe and the encoded domains are
+        shared instead of computed again. If the DAG has no dataframe, because it was
+        made via `DAG.from_chunks`, the cached tables are copied as well.
+        """
+        new_dag = DAG(pd.DataFrame(columns=self.nodes))
+        new_dag.df = self.df
+        if self.df is None:
+            new_dag.counts, new_dag.factors = dict(self.counts), dict(self.factors)
+            new_dag.prob_tables, new_dag.cached = dict(self.prob_tables), self.cached
         new_dag.graph = self.graph.copy()
+        new_dag._domains, new_dag._index, new_dag._codes = self._domains, self._index, self._codes
+        return new_dag
+
+    def with_factors(self, factors, graph=None):
+        """
+        Returns a cached DAG that shares the dataframe and the domains of this DAG
+        but that uses other probability tables for some of the nodes. The tables of
+        the remaining nodes are reused from this DAG.
+
+        ## Input
+
+        - **factors**: dictionary that maps nodes to their new `brent.factor.Factor`
+        - **graph**: the `networkx.DiGraph` to use, defaults to a copy of the current one
+        """
+        new_dag = DAG(pd.DataFrame(columns=self.nodes))
+        new_dag.df = self.df
+        new_dag.graph = self.graph.copy() if graph is None else graph
+        new_dag._domains, new_dag._index, new_dag._codes = self.domains, self.domain_index, self._codes
+        new_dag.factors = {n: factors[n] if n in factors.keys() else self.factor(n) for n in self.nodes}
+        new_dag.cached = True
+        return new_dag
+
+    def intervene(self, do):
+        """
+        Returns the DAG after the graph surgery that belongs to a `do` operation. The
+        edges into the intervened nodes are removed and their probability table
+        becomes a point mass on the enforced value. All other nodes keep their
+        parents, so their probability tables are reused from this DAG instead of
+        being counted again. The dataframe is shared, not copied, and the returned
+        DAG is cached because its tables no longer follow from the data.
+
+        ## Input
+
+        - **do**: dictionary of variable-value pairs that are enforced
+
+        ## Example
+
+        ```
+        from brent import DAG
+        from brent.common import make_fake_df
+
+        dag = DAG(make_fake_df(4)).add_edge("a", "b").add_edge("b", "c").cache()
+        dag.intervene({"b": 1}).parents("b") # outputs set()
+        ```
+        """
+        for name in do.keys():
+            if name not in self.nodes:
+                raise ValueError(f"node {name} not in available nodes: {self.nodes}")
+        graph = self.graph.copy()
+        graph.remove_edges_from([(p, n) for n in do.keys() for p in self.parents(n)])
+        new_dag = self.with_factors({n: indicator(self.domains, n, do[n]) for n in do.keys()}, graph=graph)
+        new_dag.counts = {n: c for n, c in self.counts.items() if n not in do.keys()}
+        new_dag.prob_tables = {n: t for n, t in self.prob_tables.items() if n not in do.keys()}
+        logging.debug(f"intervened on {list(do.keys())}, removed the edges into these nodes")
         return new_dag
 
     def edge_direction(self, node_a, node_b):
@@ -139,7 +539,12 @@ class DAG:
         are given. These nodes might block (or enable) a path to be active. If there
         are no active paths between two nodes then this means that the two nodes
         are (conditionally if `z` is given) independant.
+
+        Enumerating paths is slow on dense graphs, if you only need to know if
+        two nodes are independent use `DAG.is_d_separated` instead.
         """
+        if self.is_d_separated(node_a, node_b, z):
+            return []
         undirected_paths = self.directed_paths(node_a, node_b)
         active_paths = []
         for path in undirected_paths:
@@ -149,6 +554,67 @@ class DAG:
                 active_paths.append(z_path)
         return active_paths
 
+    def d_connected(self, source, z=()):
+        """
+        Returns all nodes that are d-connected to `source` given the nodes in `z`.
+        This uses the reachability ("Bayes-ball") algorithm, which visits every
+        node at most twice and runs in linear time in the size of the graph.
+
+        ## Input
+
+        - **source**: Name of a node
+        - **z**: collection of nodes that are given
+
+        ## Example
+
+        ```
+        from brent import DAG
+        from brent.common import make_fake_df
+
+        dag = DAG(make_fake_df(4)).add_edge("a", "b").add_edge("c", "b").add_edge("b", "d")
+        dag.d_connected("a") # {"b", "d"}
+        dag.d_connected("a", z=["d"]) # {"b", "c"}
+        ```
+        """
+        for node in [source, *z]:
+            if node not in self.nodes:
+                raise ValueError(f"node {node} not in available nodes: {self.nodes}")
+        z = set(z)
+        z_ancestors = z.union(*[nx.ancestors(self.graph, n) for n in z])
+        to_visit, visited, reachable = [(source, "up")], set(), set()
+        while to_visit:
+            node, direction = to_visit.pop()
+            if (node, direction) in visited:
+                continue
+            visited.add((node, direction))
+            if node not in z:
+                reachable.add(node)
+            if direction == "up" and node not in z:
+                to_visit.extend((p, "up") for p in self.graph.predecessors(node))
+                to_visit.extend((c, "down") for c in self.graph.successors(node))
+            elif direction == "down":
+                if node not in z:
+                    to_visit.extend((c, "down") for c in self.graph.successors(node))
+                if node in z_ancestors:
+                    to_visit.extend((p, "up") for p in self.graph.predecessors(node))
+        return reachable.difference({source})
+
+    def is_d_separated(self, node_a, node_b, z=()):
+        """
+        Checks if `node_a` and `node_b` are d-separated given the nodes in `z`, which
+        means that they are (conditionally) independent. Unlike `DAG.active_paths`
+        this does not enumerate any paths.
+
+        ## Input
+
+        - **node_a**: Name of a node
+        - **node_b**: Name of a node
+        - **z**: collection of nodes that are given
+        """
+        if node_b not in self.nodes:
+            raise ValueError(f"node {node_b} not in available nodes: {self.nodes}")
+        return node_b not in self.d_connected(node_a, z)
+
     def cache(self):
         """
         When calling `.cache()` the API will realise that the graph will no longer change.
@@ -158,7 +624,9 @@ class DAG:
         if self.cached:
             raise ValueError("cannot call `.cache()` on a DAG that is already cached!")
         for node in self.nodes:
-            self.prob_tables[node] = self.calc_node_table(node)
+            self.counts[node] = self.family_counts(node)
+            self.factors[node] = self.counts[node].normalise([node])
+            self.prob_tables[node] = self.factors[node].to_frame(drop_zeros=True)
         self.cached = True
         return self
 
@@ -177,26 +645,159 @@ class DAG:
             raise ValueError(f"node {name} not in available nodes: {self.nodes}")
         if name in self.prob_tables:
             return self.prob_tables[name]
-        parents = self.parents(name)
-        tbl = self.df.copy()
-        logging.debug(f"creating node table node={name} parents={parents}")
-
-        def calculate_parents_size(dataf, groups=[]):
-            return (dataf
-                    .assign(count=1)
-                    .groupby(groups)
-                    .transform(np.sum)['count'])
-
-        if len(parents) == 0:
-            tbl = tbl.assign(parent_size=lambda d: d.shape[0])
-        else:
-            tbl = tbl.assign(parent_size=lambda d: calculate_parents_size(d, list(parents)))
-        return (tbl
-                .assign(node_size=lambda d: calculate_parents_size(d, list(parents) + [name]))
-                .assign(prob=lambda d: d['node_size'] / d['parent_size'])
-                [list(parents) + [name] + ["prob"]]
-                .drop_duplicates()
-                .reset_index(drop=True))
+        logging.debug(f"creating node table node={name} parents={self.parents(name)}")
+        return self.factor(name).to_frame(drop_zeros=True)
+
+    def family_counts(self, name):
+        """
+        Counts how often every combination of values occurs for a node and its
+        parents. The counts are calculated with a single `np.bincount` over the
+        integer codes of the columns, the dataframe itself is never copied.
+
+        ## Input
+
+        - **name**: Name of a node/variable in the graph
+
+        ## Output
+
+        A `brent.factor.Factor` with the parents and the node as variables.
+        """
+        if name in self.counts:
+            return self.counts[name]
+        if self.df is None:
+            raise ValueError(f"there are no counts for node {name} because the DAG has no dataframe")
+        if self._codes is None:
+            self._codes = self._frame_codes(self.df)
+        return self._count_family(self._codes, list(self.parents(name)) + [name])
+
+    def _frame_codes(self, dataframe):
+        """Integer-codes the columns of a dataframe against the current domains."""
+        return {n: self.encode(n, dataframe[n]) for n in self.nodes}
+
+    def _count_family(self, codes, family):
+        """
+        Counts every combination of values of a family. The flat index into the table
+        is built one column at a time so only a single integer array is allocated.
+        """
+        shape = tuple(len(self.domains[n]) for n in family)
+        flat = codes[family[0]].astype(np.intp)
+        valid = codes[family[0]] >= 0
+        for n, size in zip(family[1:], shape[1:]):
+            flat *= size
+            flat += codes[n]
+            valid &= codes[n] >= 0
+        if not valid.all():
+            flat = flat[valid]
+        counts = np.bincount(flat, minlength=int(np.prod(shape))).reshape(shape)
+        return Factor(family, self.domains, counts)
+
+    def _grow_domains(self, dataframe):
+        """
+        Adds values that have not been seen before to the domains and resizes the counts.
+        The domain dictionaries are replaced instead of changed because copies of this
+        DAG share them.
+        """
+        domains, index = dict(self._domains), dict(self._index)
+        for n in self.nodes:
+            new_values = pd.Categorical(dataframe[n]).categories
+            if not new_values.isin(domains[n]).all():
+                values = pd.Index(domains[n]).append(new_values).unique()
+                domains[n] = tuple(pd.Categorical(values).categories)
+                index[n] = {v: i for i, v in enumerate(domains[n])}
+        if domains != self._domains:
+            self._domains, self._index = domains, index
+            logging.debug(f"domains grew to {self.domains}")
+            self._codes = None
+            self.counts = {n: c.reindex(self.domains) for n, c in self.counts.items()}
+            self._batches = [{n: c.reindex(self.domains) for n, c in b.items()} for b in self._batches]
+
+    def partial_fit(self, dataframe, decay=None, window=None):
+        """
+        Updates the counts and probability tables with new rows of data. Only the
+        new rows are counted, so the cost does not grow with the history that was
+        seen before. The DAG is cached first if this did not happen yet.
+
+        ## Input
+
+        - **dataframe**: pandas object with new rows, it should contain all nodes
+        - **decay**: multiply the existing counts by this number before adding the
+                     new ones, a value below one lets the model track drift
+        - **window**: only keep the counts of the last `window` batches, the data
+                      that the DAG was created with counts as the first batch
+
+        ## Example
+
+        ```
+        from brent import DAG
+        from brent.common import make_fake_df
+
+        dag = DAG(make_fake_df(4)).add_edge("a", "b").add_edge("b", "c").cache()
+        dag.partial_fit(make_fake_df(4, rows=10, seed=1), decay=0.9)
+        ```
+        """
+        if (decay is not None) and (window is not None):
+            raise ValueError("use either `decay` or `window`, not both")
+        missing = [n for n in self.nodes if n not in dataframe.columns]
+        if len(missing) > 0:
+            raise ValueError(f"columns {missing} are missing in the new rows")
+        if not self.cached:
+            self.cache()
+        if any(n not in self.counts for n in self.nodes):
+            raise ValueError("the DAG has no counts to update, it was made from probability tables")
+        self._grow_domains(dataframe)
+        codes = self._frame_codes(dataframe)
+        batch = {n: self._count_family(codes, list(c.variables)) for n, c in self.counts.items()}
+        if window is not None:
+            self._batches = (self._batches or [dict(self.counts)]) + [batch]
+        for node in self.nodes:
+            counts = self.counts[node].values * (1 if decay is None else decay) + batch[node].values
+            if (window is not None) and (len(self._batches) > window):
+                counts = counts - self._batches[0][node].values
+            self.counts[node] = Factor(batch[node].variables, self.domains, counts)
+            self.factors[node] = self.counts[node].normalise([node])
+            self.prob_tables[node] = self.factors[node].to_frame(drop_zeros=True)
+        if (window is not None) and (len(self._batches) > window):
+            self._batches = self._batches[1:]
+        if self.junction_tree is not None:
+            self.junction_tree.update(self.factors)
+        self._version += 1
+        return self
+
+    def compile(self):
+        """
+        Compiles the DAG into a `brent.inference.JunctionTree`. This structure is
+        built once and then reused by every `Query` without a `give_table` request,
+        which is a lot faster when many queries are run against the same DAG.
+        The DAG is cached first if this did not happen yet.
+
+        ## Example
+
+        ```
+        from brent import DAG, Query
+        from brent.common import make_fake_df
+
+        dag = DAG(make_fake_df(4)).add_edge("a", "b").add_edge("b", "c").compile()
+        Query(dag).given(a=1).infer()
+        ```
+        """
+        if not self.cached:
+            self.cache()
+        self.junction_tree = JunctionTree(self.factors)
+        return self
+
+    def factor(self, name):
+        """
+        Returns the probability table for a given node as a dense `brent.factor.Factor`.
+
+        ## Input
+
+        - **name**: Name of a node/variable in the graph
+        """
+        if name in self.factors:
+            return self.factors[name]
+        if name in self.prob_tables:
+            return Factor.from_frame(self.prob_tables[name], domains=self.domains)
+        return self.family_counts(name).normalise([name])
 
     def merge_probs(self, this_df, that_df):
         """
@@ -255,20 +856,54 @@ class DAG:
             .add_edge("c", "d"))
         ```
         """
-        if source not in self.df.columns:
-            raise ValueError(f"cause {source} not in dataframe")
-        if sink not in self.df.columns:
-            raise ValueError(f"effect {sink} not in dataframe")
-        if self.cached:
-            raise RuntimeError("Cannot change a graph when the dag is baked.")
-        new_graph = self.graph.copy()
-        new_graph.add_edge(source, sink)
-        if not nx.is_directed_acyclic_graph(new_graph):
+        self._check_new_edge(source, sink)
+        if (source == sink) or nx.has_path(self.graph, sink, source):
             raise ValueError(f"edge {source} -> {sink} causes DAG to get cycle")
         self.graph.add_edge(source, sink)
+        self._version += 1
         logging.debug(f"created connection {source} -> {sink}")
         return self
 
+    def add_edges(self, edges) -> 'DAG':
+        """
+        Adds many edges to the graph at once. The graph is checked for cycles
+        once after all edges are added, if there is a cycle none of the edges
+        are added.
+
+        ## Input
+
+        - **edges**: iterable of `(source, sink)` tuples
+
+        ## Example
+
+        ```
+        from brent import DAG
+        from brent.common import make_fake_df
+
+        DAG(dataframe=make_fake_df(4)).add_edges([("a", "b"), ("b", "c"), ("c", "d")])
+        ```
+        """
+        edges = [(source, sink) for source, sink in edges]
+        for source, sink in edges:
+            self._check_new_edge(source, sink)
+        new_edges = [e for e in dict.fromkeys(edges) if not self.graph.has_edge(*e)]
+        self.graph.add_edges_from(new_edges)
+        if not nx.is_directed_acyclic_graph(self.graph):
+            cycle = nx.find_cycle(self.graph)
+            self.graph.remove_edges_from(new_edges)
+            raise ValueError(f"edges cause DAG to get cycle: {cycle}")
+        self._version += 1
+        logging.debug(f"created {len(new_edges)} connections")
+        return self
+
+    def _check_new_edge(self, source, sink):
+        if source not in self.graph:
+            raise ValueError(f"cause {source} not in dataframe")
+        if sink not in self.graph:
+            raise ValueError(f"effect {sink} not in dataframe")
+        if self.cached:
+            raise RuntimeError("Cannot change a graph when the dag is baked.")
+
     def children(self, node):
         """
         Return the children of a node.
@@ -344,12 +979,74 @@ class DAG:
         """
         return set(list(self.children(node)) + list(self.parents(node)))
 
-    def independences(self):
+    def markov_blanket(self, node):
+        """
+        Return the Markov blanket of a node; its parents, its children and the
+        other parents of its children. Given these nodes the node is independent
+        of all the other nodes in the DAG.
+
+        ## Input
+
+        - **node**: Name of a node
+
+        ## Example
+
+        ```
+        from brent import DAG
+        from brent.common import make_fake_df
+
+        dag = (DAG(dataframe=make_fake_df(4))
+            .add_edge("a", "b")
+            .add_edge("c", "b")
+            .add_edge("b", "d"))
+
+        dag.markov_blanket("a") #outputs ["b","c"]
+        ```
+        """
+        blanket = self.connections(node)
+        for child in self.children(node):
+            blanket = blanket.union(self.parents(child))
+        return blanket.difference({node})
+
+    def independences(self, pairwise=True, local=True):
         """
-        **NOT IMPLEMENTED YET**
+        Lists the conditional independences that are implied by the graph. Every
+        statement is a tuple `(node_a, node_b, given)` which reads as "`node_a` is
+        independent of `node_b` given the nodes in the tuple `given`". Each statement
+        is listed once even if it is implied by both kinds.
+
+        We run a single reachability pass (see `DAG.d_connected`) per node and kind
+        so this remains fast for graphs with hundreds of nodes.
+
+        ## Input
+
+        - **pairwise**: list the pairs of nodes that are marginally independent
+        - **local**: list the pairs that are independent given the parents of the
+                     first node, this includes the local Markov property
+
+        ## Example
+
+        ```
+        from brent import DAG
+        from brent.common import make_fake_df
+
+        dag = DAG(make_fake_df(3)).add_edge("a", "b").add_edge("b", "c")
+        dag.independences() # [('c', 'a', ('b',))]
+        ```
         """
-        # https://www.slideshare.net/duytungpham18/lecture-1-graphical-models
-        pass
+        order = {n: i for i, n in enumerate(self.nodes)}
+        statements = {}
+        for node in self.nodes:
+            givens = []
+            if pairwise:
+                givens.append(())
+            if local:
+                givens.append(tuple(sorted(self.parents(node), key=order.get)))
+            for given in givens:
+                separated = set(self.nodes).difference(self.d_connected(node, given), given, {node})
+                for other in sorted(separated, key=order.get):
+                    statements.setdefault((frozenset([node, other]), given), (node, other, given))
+        return list(statements.values())
 
     def plot(self):
         """A pretty plotting function."""
@@ -0,0 +1,320 @@
+"""
+The `brent.inference` module contains the exact inference engine that is
+used by `brent.query.Query`. Instead of building the full joint probability
+table it sums out the variables that are not asked for one at a time, so the
+intermediate factors only ever get as large as the structure of the graph allows.
+"""
+
+import logging
+import itertools as it
+from functools import reduce
+
+import numpy as np
+import networkx as nx
+
+from brent.factor import Factor
+
+
+def interaction_graph(scopes):
+    """
+    Creates the undirected graph where two variables are connected if they
+    appear together in one of the scopes.
+    """
+    graph = nx.Graph()
+    for scope in scopes:
+        graph.add_nodes_from(scope)
+        graph.add_edges_from(it.combinations(scope, 2))
+    return graph
+
+
+def _fill_in(graph, node):
+    neighbours = list(graph.neighbors(node))
+    return sum(1 for a, b in it.combinations(neighbours, 2) if not graph.has_edge(a, b))
+
+
+def elimination_order(scopes, variables):
+    """
+    Determines the order in which variables are summed out. We use the greedy
+    min-fill heuristic; at every step we pick the variable that adds the fewest
+    new connections to the interaction graph, ties are broken by degree. Eliminating
+    a variable only changes the scores of its neighbours and their neighbours, so
+    only those are scored again.
+
+    ## Inputs
+
+    - **scopes**: iterable of lists of variables, one list per factor
+    - **variables**: the variables that need to be eliminated
+    """
+    graph = interaction_graph(scopes)
+    graph.add_nodes_from(variables)
+    scores = {v: (_fill_in(graph, v), graph.degree(v)) for v in variables}
+    order = []
+    while scores:
+        var = min(scores, key=scores.get)
+        neighbours = list(graph.neighbors(var))
+        graph.add_edges_from(it.combinations(neighbours, 2))
+        graph.remove_node(var)
+        del scores[var]
+        order.append(var)
+        changed = set(neighbours).union(*[graph.neighbors(n) for n in neighbours])
+        for v in changed.intersection(scores):
+            scores[v] = (_fill_in(graph, v), graph.degree(v))
+    logging.debug(f"elimination order: {order}")
+    return order
+
+
+def variable_elimination(factors, targets, evidence=None):
+    """
+    Calculates the joint distribution of the `targets` given the `evidence`
+    by summing out all other variables one at a time.
+
+    ## Inputs
+
+    - **factors**: list of `brent.factor.Factor` objects, typically one per node
+    - **targets**: list of variables that should remain in the output
+    - **evidence**: dictionary of variable-value pairs that are observed
+
+    ## Output
+
+    A normalised `brent.factor.Factor` with the `targets` as variables.
+    """
+    if evidence is None:
+        evidence = dict()
+    factors = [f.reduce(evidence) for f in factors]
+    scopes = [f.variables for f in factors]
+    variables = list(dict.fromkeys(v for scope in scopes for v in scope))
+    to_eliminate = [v for v in variables if v not in targets]
+    for var in elimination_order(scopes, to_eliminate):
+        related = [f for f in factors if var in f.variables]
+        factors = [f for f in factors if var not in f.variables]
+        factors.append(reduce(lambda a, b: a * b, related).marginalise([var]))
+        logging.debug(f"eliminated {var}, {len(factors)} factors remain")
+    return reduce(lambda a, b: a * b, factors).transpose(list(targets)).normalise()
+
+
+def prune(factors, targets, evidence=None):
+    """
+    Removes the factors that cannot influence the distribution of the `targets`
+    given the `evidence`. This happens in two steps:
+
+    1. barren nodes are removed; these are nodes that are neither a target nor
+       observed and that have no target or observed node among their descendants
+    2. nodes that are d-separated from the targets given the evidence are removed;
+       in the moral graph of the remaining nodes these are the nodes that can only
+       reach a target via an observed node
+
+    ## Inputs
+
+    - **factors**: dictionary that maps each node to its `brent.factor.Factor`
+    - **targets**: list of variables that we want the distribution for
+    - **evidence**: dictionary of variable-value pairs that are observed
+
+    ## Output
+
+    A dictionary with the factors that are needed to answer the query.
+    """
+    evidence = evidence or dict()
+    parents = {n: set(f.variables).difference({n}) for n, f in factors.items()}
+    relevant, to_visit = set(), list(targets) + list(evidence.keys())
+    while to_visit:
+        node = to_visit.pop()
+        if node not in relevant:
+            relevant.add(node)
+            to_visit.extend(parents[node])
+    scopes = [[v for v in factors[n].variables if v not in evidence] for n in relevant]
+    graph = interaction_graph(scopes)
+    connected = set().union(*[nx.node_connected_component(graph, t) for t in targets if t in graph])
+    pruned = {n: factors[n] for n, scope in zip(relevant, scopes) if connected.intersection(scope)}
+    logging.debug(f"pruned the query from {len(factors)} to {len(pruned)} factors")
+    return pruned
+
+
+def indicator(domains, name, value):
+    """
+    Creates a factor that puts all probability on a single value of a node. This
+    is used for observed values as well as for values that are enforced via `do`.
+
+    ## Inputs
+
+    - **domains**: dictionary with the values that each node can take
+    - **name**: name of the node
+    - **value**: the value that gets all the probability
+    """
+    if value not in domains[name]:
+        raise ValueError(f"value {value} does not occur for node {name}")
+    values = np.zeros(len(domains[name]))
+    values[domains[name].index(value)] = 1.0
+    return Factor([name], domains, values)
+
+
+def triangulate(scopes):
+    """
+    Finds the maximal cliques of the triangulated interaction graph by eliminating
+    all variables in min-fill order. Every factor scope is contained in one of them.
+
+    ## Inputs
+
+    - **scopes**: iterable of lists of variables, one list per factor
+    """
+    graph = interaction_graph(scopes)
+    cliques = []
+    for var in elimination_order(scopes, list(graph.nodes)):
+        cliques.append(frozenset([var]).union(graph.neighbors(var)))
+        graph.add_edges_from(it.combinations(graph.neighbors(var), 2))
+        graph.remove_node(var)
+    maximal = [c for c in cliques if not any(c < other for other in cliques)]
+    return [tuple(sorted(c, key=str)) for c in dict.fromkeys(maximal)]
+
+
+class JunctionTree:
+    """
+    A junction tree (or clique tree) is compiled once from the probability tables of
+    a DAG. Every query afterwards only multiplies evidence into the cliques and passes
+    messages along the tree, which gives the marginals of all nodes in one sweep.
+
+    ```
+    from brent import DAG
+    from brent.common import make_fake_df
+    from brent.inference import JunctionTree
+
+    dag = DAG(make_fake_df(4)).add_edge("a", "b").add_edge("b", "c").cache()
+    tree = JunctionTree(dag.factors)
+    tree.query(evidence={"a": 1})
+    ```
+    """
+    def __init__(self, factors):
+        """
+        Create a new junction tree.
+
+        ## Inputs
+
+        - **factors**: dictionary that maps each node to its `brent.factor.Factor`
+        """
+        self.cliques = triangulate([f.variables for f in factors.values()])
+        self.tree = nx.maximum_spanning_tree(self._clique_graph())
+        self.assignment = {n: self._smallest_clique(f.variables) for n, f in factors.items()}
+        logging.debug(f"compiled junction tree with cliques {self.cliques}")
+        self.update(factors)
+
+    def _clique_graph(self):
+        graph = nx.Graph()
+        graph.add_nodes_from(range(len(self.cliques)))
+        for i, j in it.combinations(range(len(self.cliques)), 2):
+            graph.add_edge(i, j, weight=len(set(self.cliques[i]).intersection(self.cliques[j])))
+        return graph
+
+    def _smallest_clique(self, variables):
+        candidates = [i for i, c in enumerate(self.cliques) if set(variables).issubset(c)]
+        return min(candidates, key=lambda i: len(self.cliques[i]))
+
+    def update(self, factors):
+        """
+        Replaces the probability tables while keeping the compiled structure. This
+        is useful when the counts of the DAG change but the edges do not.
+
+        ## Inputs
+
+        - **factors**: dictionary that maps each node to its `brent.factor.Factor`
+        """
+        self.factors = dict(factors)
+        self.domains = {v: d for f in self.factors.values() for v, d in f.domains.items()}
+        self.potentials = [self._potential(i, self.factors) for i in range(len(self.cliques))]
+
+    def _potential(self, idx, factors):
+        clique = self.cliques[idx]
+        potential = Factor(clique, self.domains, np.ones(tuple(len(self.domains[v]) for v in clique)))
+        for node, factor in factors.items():
+            if self.assignment[node] == idx:
+                potential = potential * factor
+        return potential.transpose(clique)
+
+    def _message(self, source, target, potentials, messages):
+        separator = set(self.cliques[source]).intersection(self.cliques[target])
+        message = potentials[source]
+        for neighbour in self.tree.neighbors(source):
+            if neighbour != target:
+                message = message * messages[(neighbour, source)]
+        return message.marginalise([v for v in message.variables if v not in separator]).normalise()
+
+    def calibrate(self, potentials):
+        """
+        Passes messages from the leaves to the root and back again. Returns the
+        belief of every clique, which is proportional to the joint distribution
+        of the clique variables and the evidence.
+
+        ## Inputs
+
+        - **potentials**: list of factors, one for every clique
+        """
+        messages = {}
+        postorder = list(nx.dfs_postorder_nodes(self.tree, 0))
+        parent = nx.dfs_predecessors(self.tree, 0)
+        for node in postorder[:-1]:
+            messages[(node, parent[node])] = self._message(node, parent[node], potentials, messages)
+        for node in reversed(postorder):
+            for child in self.tree.neighbors(node):
+                if parent.get(node) != child:
+                    messages[(node, child)] = self._message(node, child, potentials, messages)
+        beliefs = []
+        for idx, potential in enumerate(potentials):
+            for neighbour in self.tree.neighbors(idx):
+                potential = potential * messages[(neighbour, idx)]
+            beliefs.append(potential)
+        return beliefs
+
+    def _beliefs(self, evidence, do):
+        factors = {**self.factors, **{k: indicator(self.domains, k, v) for k, v in do.items()}}
+        changed = {self.assignment[k] for k in do.keys()}
+        potentials = [self._potential(i, factors) if i in changed else p for i, p in enumerate(self.potentials)]
+        for name, value in evidence.items():
+            idx = self._smallest_clique([name])
+            potentials[idx] = (potentials[idx] * indicator(self.domains, name, value)).transpose(self.cliques[idx])
+        return self.calibrate(potentials)
+
+    def families(self, evidence=None, do=None):
+        """
+        Calculates the joint distribution of every node together with its parents.
+        Every family fits in the clique that its probability table is assigned to,
+        so all of them follow from a single calibration.
+
+        ## Inputs
+
+        - **evidence**: dictionary of variable-value pairs that are observed
+        - **do**: dictionary of variable-value pairs that are enforced
+
+        ## Output
+
+        A dictionary that maps each node to a normalised `brent.factor.Factor` with
+        the same variables as the probability table of the node.
+        """
+        beliefs = self._beliefs(evidence or dict(), do or dict())
+        output = {}
+        for node, factor in self.factors.items():
+            belief = beliefs[self.assignment[node]]
+            output[node] = belief.marginalise([v for v in belief.variables if v not in factor.variables])
+            output[node] = output[node].transpose(factor.variables).normalise()
+        return output
+
+    def query(self, evidence=None, do=None):
+        """
+        Calculates the marginal distribution of every node that is not observed.
+
+        ## Inputs
+
+        - **evidence**: dictionary of variable-value pairs that are observed
+        - **do**: dictionary of variable-value pairs that are enforced, the probability
+                  table of these nodes is replaced by the enforced value
+
+        ## Output
+
+        A dictionary that maps each unobserved node to a normalised `brent.factor.Factor`.
+        """
+        evidence, do = evidence or dict(), do or dict()
+        beliefs = self._beliefs(evidence, do)
+        output = {}
+        for node in self.factors.keys():
+            if node in evidence.keys() or node in do.keys():
+                continue
+            belief = beliefs[self._smallest_clique([node])]
+            output[node] = belief.marginalise([v for v in belief.variables if v != node]).normalise()
+        return output
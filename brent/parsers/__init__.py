@@ -1,3 +1,4 @@
-from .bif import bif
+from .bif import bif, bif_factors, write_bif
+from .xmlbif import xmlbif_factors, write_xmlbif
 
-__all__ = ['bif']
+__all__ = ['bif', 'bif_factors', 'write_bif', 'xmlbif_factors', 'write_xmlbif']
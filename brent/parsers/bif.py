@@ -1,95 +1,365 @@
+import io
+import itertools as it
 import re
 import logging
-from typing import Tuple, List, Iterator
+from typing import Tuple, List, Dict, Iterator, Iterable, Union, TextIO, Optional
 
+import numpy as np
 import pandas as pd
 
 from brent.common import join_independent, join_dependent
+from brent.factor import Factor
 
 logger = logging.getLogger(__name__)
 
 
-PARSER_PATTERNS = {
-    'network': r'network (?P<networktype>\w+) {',
-    'variable': r"(variable (?P<varname>\w+) {\s+type (?P<vartype>\w+) \[ \d+ \] \{ (?P<states>[^}]*)\}\;)",
-    'uncond_probability': r"probability \( (?P<varname>\w+) \) \{\s+table (?P<probtable>[^;]*)",
-    'cond_probability': r"probability \( (?P<varname>\w+) \| (?P<conditionals>[^)]*) \) {\s (?P<probs>[^\}]*)",
-    'prob_table': r"^(\s+)? \((?P<keys>.*?)\) (?P<probabilities>[^;]*);",
+HEADER_PATTERNS = {
+    'network': re.compile(r'network\s+(?P<networktype>[^\s{]+)\s*\{'),
+    'variable': re.compile(r'variable\s+(?P<varname>[^\s{]+)\s*\{'),
+    'probability': re.compile(r'probability\s*\(\s*(?P<varname>[^\s|)]+)\s*(\|\s*(?P<conditionals>[^)]*))?\)\s*\{'),
 }
 
+STATEMENT_PATTERNS = {
+    'type': re.compile(r'type\s+(?P<vartype>\w+)\s*\[\s*(?P<n_states>\d+)\s*\]\s*\{(?P<states>[^}]*)\}'),
+    'row': re.compile(r'\((?P<keys>[^)]*)\)(?P<probabilities>.*)', re.DOTALL),
+}
+
+
+class Block:
+    """
+    A block of a bif file. The `kind` is one of `network`, `variable` or `probability`,
+    `line` is the line number of the header of the block.
+
+    - for a `network` block `name` is the network type
+    - for a `variable` block `name` is the variable and `states` its values
+    - for a `probability` block `name` is the variable and `conditionals` its parents,
+      `keys` holds one tuple of parent values per row of `probabilities`, which is a
+      numpy array with one column per state. Without parents `keys` is `None` and
+      `probabilities` has a single dimension.
+    """
+    def __init__(self, kind: str, name: str, line: int, states: Optional[List[str]] = None,
+                 conditionals: Optional[List[str]] = None, keys: Optional[List[Tuple[str, ...]]] = None,
+                 probabilities: Optional[np.ndarray] = None):
+        self.kind = kind
+        self.name = name
+        self.line = line
+        self.states = states
+        self.conditionals = conditionals
+        self.keys = keys
+        self.probabilities = probabilities
+
+    def __repr__(self):
+        return f"Block(kind={self.kind}, name={self.name}, line={self.line})"
+
+
+def _split(text: str) -> List[str]:
+    return [t.strip() for t in text.split(',') if t.strip() != '']
+
+
+def _to_floats(numbers: List[Tuple[int, str]]) -> np.ndarray:
+    """Converts all numbers of a block with a single numpy call."""
+    try:
+        return np.array(' '.join(text for _, text in numbers).replace(',', ' ').split(), dtype=float)
+    except ValueError:
+        for line_no, text in numbers:
+            try:
+                np.array(text.replace(',', ' ').split(), dtype=float)
+            except ValueError:
+                raise ValueError(f"line {line_no}: probabilities `{text.strip()}` are not all numbers")
+        raise
+
+
+TOKENS = re.compile(r'([;{}])')
+HEADER_START = re.compile(r'(network|variable|probability)\b')
+
+
+def _statements(lines: Iterator[Tuple[int, str]], header: int,
+                rest: List[Tuple[int, str]]) -> Iterator[Tuple[int, str]]:
+    """
+    Yields the `;` terminated statements inside a block until its closing brace. The
+    lines are split on `;`, `{` and `}`, so statements and braces can be spread over
+    lines in any way. Braces inside a statement, like the states of a `type`, are kept.
+    Text after the closing brace is put in `rest` for the next block.
+    """
+    buffer, start, depth = [], None, 0
+    for line_no, line in lines:
+        tokens = TOKENS.split(line.split('//')[0])
+        for i, token in enumerate(tokens):
+            if token == '}' and depth == 0:
+                if ''.join(buffer).strip():
+                    raise ValueError(f"line {start}: expected `;` after `{''.join(buffer).strip()}`")
+                remainder = ''.join(tokens[i + 1:]).strip()
+                if remainder:
+                    rest.append((line_no, remainder))
+                return
+            if token == ';' and depth == 0:
+                if start is not None:
+                    yield start, ''.join(buffer).strip()
+                buffer, start = [], None
+                continue
+            depth += (token == '{') - (token == '}')
+            if start is None and token.strip():
+                start = line_no
+            buffer.append(token)
+        buffer.append(' ')
+    raise ValueError(f"line {header}: block is not closed")
+
+
+def _lines(source: Iterator[Tuple[int, str]], rest: List[Tuple[int, str]]) -> Iterator[Tuple[int, str]]:
+    """Yields the numbered lines of a file, but first the text that is put back in `rest`."""
+    while True:
+        if rest:
+            yield rest.pop()
+            continue
+        item = next(source, None)
+        if item is None:
+            return
+        yield item
+
+
+def _variable(name: str, header: int, lines: Iterator[Tuple[int, str]], rest: List[Tuple[int, str]]) -> Block:
+    states = None
+    for line_no, statement in _statements(lines, header, rest):
+        if statement.startswith('property'):
+            continue
+        match = STATEMENT_PATTERNS['type'].match(statement)
+        if match is None:
+            raise ValueError(f"line {line_no}: could not parse `{statement}` in variable {name}")
+        if match.group('vartype') != 'discrete':
+            raise ValueError(f"line {line_no}: Brent only supports discrete variables")
+        states = _split(match.group('states'))
+        if len(states) != int(match.group('n_states')):
+            raise ValueError(f"line {line_no}: variable {name} has {len(states)} states "
+                             f"but declares {match.group('n_states')}")
+    if states is None:
+        raise ValueError(f"line {header}: variable {name} has no type")
+    logger.info(f'Found variable: {name} with states {states}')
+    return Block('variable', name, header, states=states)
+
+
+def _probability(name: str, conditionals: List[str], header: int, lines: Iterator[Tuple[int, str]],
+                 rest: List[Tuple[int, str]]) -> Block:
+    keys, numbers = [], []
+    for line_no, statement in _statements(lines, header, rest):
+        if statement.startswith('property'):
+            continue
+        if statement.startswith('table'):
+            if conditionals:
+                raise ValueError(f"line {line_no}: `table` is only supported without conditionals, use rows")
+            numbers.append((line_no, statement[len('table'):]))
+            continue
+        match = STATEMENT_PATTERNS['row'].match(statement)
+        if match is None:
+            raise ValueError(f"line {line_no}: could not parse `{statement}` in probability of {name}")
+        row_keys = tuple(_split(match.group('keys')))
+        if len(row_keys) != len(conditionals):
+            raise ValueError(f"line {line_no}: expected {len(conditionals)} values in `({match.group('keys')})`")
+        keys.append(row_keys)
+        numbers.append((line_no, match.group('probabilities')))
+    probabilities = _to_floats(numbers)
+    if conditionals:
+        if len(keys) == 0 or len(probabilities) % len(keys) != 0:
+            raise ValueError(f"line {header}: rows of probability of {name} do not have the same length")
+        probabilities = probabilities.reshape(len(keys), -1)
+    logger.info(f'Found probability: {name} | {conditionals}')
+    return Block('probability', name, header, conditionals=conditionals,
+                 keys=keys if conditionals else None, probabilities=probabilities)
+
+
+def _header(line_no: int, text: str, lines: Iterator[Tuple[int, str]]) -> Tuple[str, Tuple[int, str]]:
+    """
+    Collects the header of a block up to its opening brace, the header can be spread
+    over lines. Returns the header and the numbered text after the brace.
+    """
+    buffer = []
+    for header_line, line in it.chain([(line_no, text)], lines):
+        head, brace, remainder = (TOKENS.split(line.split('//')[0], maxsplit=1) + ['', ''])[:3]
+        buffer.append(head.strip())
+        header = ' '.join(b for b in buffer if b)
+        if brace == '{':
+            return header + ' {', (header_line, remainder)
+        if brace:
+            raise ValueError(f"line {line_no}: expected `{{` after `{header}`")
+        if not HEADER_START.match(header):
+            raise ValueError(f"line {line_no}: expected a network, variable or probability block, got `{header}`")
+    raise ValueError(f"line {line_no}: block `{' '.join(buffer).strip()}` has no body")
+
+
+def parse_blocks(bif: Union[str, TextIO, Iterable[str]]) -> Iterator[Block]:
+    """
+    Reads a bif file in a single pass and yields its blocks one at a time, so only
+    a single block needs to be in memory. The probabilities of a block are converted
+    to a numpy array all at once. Lines that cannot be parsed raise a `ValueError`
+    that mentions the line number.
+
+    ## Inputs
+
+    - **bif**: a bif string, an open file or any other iterable of lines
+
+    ## Example
+
+    ```
+    from brent.parsers.bif import parse_blocks
+
+    with open("asia.bif") as f:
+        for block in parse_blocks(f):
+            print(block.kind, block.name)
+    ```
+    """
+    if isinstance(bif, str):
+        bif = io.StringIO(bif)
+    rest = []
+    lines = _lines(enumerate(bif, start=1), rest)
+    for line_no, line in lines:
+        text = line.split('//')[0].strip()
+        if text == '':
+            continue
+        header, remainder = _header(line_no, text, lines)
+        for kind, pattern in HEADER_PATTERNS.items():
+            match = pattern.fullmatch(header)
+            if match is not None:
+                break
+        else:
+            raise ValueError(f"line {line_no}: expected a network, variable or probability block, got `{header}`")
+        block_lines = it.chain([remainder], lines)
+        if kind == 'network':
+            for _ in _statements(block_lines, line_no, rest):
+                pass
+            yield Block('network', match.group('networktype'), line_no)
+        elif kind == 'variable':
+            yield _variable(match.group('varname'), line_no, block_lines, rest)
+        else:
+            conditionals = _split(match.group('conditionals') or '')
+            yield _probability(match.group('varname'), conditionals, line_no, block_lines, rest)
+
 
 def parse_network_type(bif: str) -> str:
     """Returns the network type of a bif string"""
-    return re.match(PARSER_PATTERNS['network'], bif).group('networktype')
+    for block in parse_blocks(bif):
+        if block.kind == 'network':
+            return block.name
+    raise ValueError("no network block found")
 
 
 def parse_variables(bif: str) -> Iterator[Tuple[str, List[str]]]:
     """Returns a generator of `(varname, states)` tuples from a bif string"""
-    for var in re.finditer(PARSER_PATTERNS['variable'], bif):
-        varname = var.group('varname')
-        vartype = var.group('vartype')
-        states = var.group('states').strip().split(', ')
+    for block in parse_blocks(bif):
+        if block.kind == 'variable':
+            yield block.name, block.states
 
-        logger.info(f'Found variable: {varname} with states {states}')
-        if vartype != 'discrete':
-            raise ValueError('Brent only supports discrete variables')
 
-        yield varname, states
+def _check_sums(block: Block):
+    sums = block.probabilities.sum(axis=-1)
+    for row in np.flatnonzero(np.atleast_1d(np.abs(1 - sums) > 0.01)):
+        logger.warning(f'Variable {block.name} | {block.conditionals} has probabilities not summing to 1 '
+                       f'in row {row + 1} of the block at line {block.line} (sums to {np.atleast_1d(sums)[row]})')
 
 
 def parse_unconditional_probabilities(bif: str) -> Iterator[Tuple[str, List[float]]]:
     """Parses unconditional probabilities from a bif string"""
-    for prob in re.finditer(PARSER_PATTERNS['uncond_probability'], bif):
-        varname = prob.group('varname')
-        probs = [float(p) for p in prob.group('probtable').split(', ')]
-
-        logger.info(f'Found base probability for variable {varname}: {probs}')
-        if 1 - sum(probs) > 0.01:
-            logger.warning(f'Variable {varname} has probabilities not summing to 1 (sums to {sum(probs)})')
-
-        yield varname, probs
+    for block in parse_blocks(bif):
+        if block.kind == 'probability' and not block.conditionals:
+            _check_sums(block)
+            yield block.name, block.probabilities.tolist()
 
 
 def parse_conditional_probabilities(bif: str):
     """parses conditional probabilities from a bif string"""
-    for cond_prob in re.finditer(PARSER_PATTERNS['cond_probability'], bif):
-        varname, prob_table = cond_prob.group('varname'), cond_prob.group('probs')
-        conditionals = cond_prob.group('conditionals').split(', ')
-        logger.info(f'Found conditional probability: {varname} | {conditionals}')
+    for block in parse_blocks(bif):
+        if block.kind == 'probability' and block.conditionals:
+            _check_sums(block)
+            rows = [list(k) + p for k, p in zip(block.keys, block.probabilities.tolist())]
+            yield block.name, block.conditionals, rows
 
-        probabilities_lst = []
 
-        for line_no, prob_entry in enumerate(re.finditer(PARSER_PATTERNS['prob_table'], prob_table, re.MULTILINE)):
-            keys = prob_entry.group('keys').split(', ')
-            probabilities = [float(p) for p in prob_entry.group('probabilities').split(', ')]
-            if 1 - sum(probabilities) > 0.01:
-                logger.warning(f'Variable {varname} | {conditionals} has probabilities not summing to 1 '
-                               f'in line {line_no + 1} (sums to {sum(probabilities)})')
+def _factor(block: Block, variable_states: Dict[str, List[str]]) -> Factor:
+    """Turns a probability block into a factor with the conditionals first and the variable last."""
+    if block.name not in variable_states:
+        raise ValueError(f"line {block.line}: probability of undeclared variable {block.name}")
+    if block.probabilities.shape[-1] != len(variable_states[block.name]):
+        raise ValueError(f"line {block.line}: probability of {block.name} does not have one value per state")
+    variables = block.conditionals + [block.name]
+    domains = {v: variable_states[v] for v in variables if v in variable_states}
+    if len(domains) != len(variables):
+        raise ValueError(f"line {block.line}: probability of {block.name} has undeclared conditionals")
+    if not block.conditionals:
+        return Factor(variables, domains, block.probabilities)
+    values = np.full(tuple(len(domains[v]) for v in variables), np.nan)
+    index = [{value: i for i, value in enumerate(domains[v])} for v in block.conditionals]
+    try:
+        codes = np.array([[idx[k] for idx, k in zip(index, key)] for key in block.keys])
+    except KeyError as e:
+        raise ValueError(f"line {block.line}: probability of {block.name} uses unknown value {e}")
+    values[tuple(codes.T)] = block.probabilities
+    if np.isnan(values).any():
+        raise ValueError(f"line {block.line}: probability of {block.name} does not cover all conditional values")
+    return Factor(variables, domains, values)
 
-            logger.info(f'\t{keys} - {probabilities}')
-            probabilities_lst.append((keys + probabilities))
 
-        yield varname, conditionals, probabilities_lst
+def bif_factors(bif: Union[str, TextIO]) -> Tuple[Dict[str, Factor], List[Tuple[str, str]]]:
+    """
+    Parses a Bayesian Interchange Format (bif) string or open file into one probability
+    table per variable and a set of links. Every table is a `brent.factor.Factor` with
+    the conditionals first and the variable itself last, the values of each variable
+    follow the order of the file. Unlike `bif` the joint distribution is never made,
+    so this also works for large networks.
 
+    ## Example
 
-def bif(bif: str) -> Tuple[pd.DataFrame, List[Tuple[str, str]]]:
-    """
-    Parses a Bayesian Interchange Format (bif) string into a probability table and a set of links
+    ```
+    from brent import parsers
+
+    with open("alarm.bif") as f:
+        factors, links = parsers.bif_factors(f)
+    ```
     """
-    probability_table = pd.DataFrame({'key': [1], 'prob': [1]})
+    variable_states, factors, edges = {}, {}, []
+    for block in parse_blocks(bif):
+        if block.kind == 'network' and block.name != 'unknown':
+            logger.warning("BIF Parser does not take into account known networks")
+        elif block.kind == 'variable':
+            variable_states[block.name] = block.states
+        elif block.kind == 'probability':
+            _check_sums(block)
+            factors[block.name] = _factor(block, variable_states)
+            edges += [(conditional, block.name) for conditional in block.conditionals]
+    missing = [v for v in variable_states if v not in factors]
+    if missing:
+        raise ValueError(f"variables {missing} do not have a probability block")
+    return {v: factors[v] for v in variable_states}, edges
 
-    if parse_network_type(bif) != 'unknown':
-        logger.warning("BIF Parser does not take into account known networks")
 
-    variable_states = dict(parse_variables(bif))
-    edges = []
+def bif(bif: Union[str, TextIO]) -> Tuple[pd.DataFrame, List[Tuple[str, str]]]:
+    """
+    Parses a Bayesian Interchange Format (bif) string or open file into a probability
+    table and a set of links. Note that the probability table is the joint distribution
+    of all variables, which grows exponentially with their number. Use `bif_factors`
+    for larger networks.
+    """
+    probability_table = pd.DataFrame({'key': [1], 'prob': [1]})
+    variable_states, conditional_blocks, edges = {}, [], []
 
-    for varname, probs in parse_unconditional_probabilities(bif):
-        var_df = pd.DataFrame({varname: variable_states[varname], 'prob': probs})
-        probability_table = join_independent(probability_table, var_df)
+    for block in parse_blocks(bif):
+        if block.kind == 'network' and block.name != 'unknown':
+            logger.warning("BIF Parser does not take into account known networks")
+        elif block.kind == 'variable':
+            variable_states[block.name] = block.states
+        elif block.kind == 'probability':
+            if block.name not in variable_states:
+                raise ValueError(f"line {block.line}: probability of undeclared variable {block.name}")
+            if block.probabilities.shape[-1] != len(variable_states[block.name]):
+                raise ValueError(f"line {block.line}: probability of {block.name} does not have one value per state")
+            _check_sums(block)
+            if block.conditionals:
+                conditional_blocks.append(block)
+                continue
+            var_df = pd.DataFrame({block.name: variable_states[block.name], 'prob': block.probabilities})
+            probability_table = join_independent(probability_table, var_df)
 
-    for varname, conditionals, probabilities in parse_conditional_probabilities(bif):
-        cond_df = (pd.DataFrame(probabilities, columns=conditionals + variable_states[varname])
+    for block in conditional_blocks:
+        conditionals, varname = block.conditionals, block.name
+        cond_df = (pd.DataFrame(block.keys, columns=conditionals)
+                   .join(pd.DataFrame(block.probabilities, columns=variable_states[varname]))
                    .melt(id_vars=conditionals, var_name=varname, value_name='prob')
                    .set_index(conditionals)
                    )
@@ -97,3 +367,79 @@ def bif(bif: str) -> Tuple[pd.DataFrame, List[Tuple[str, str]]]:
         edges += [(conditional, varname) for conditional in conditionals]
 
     return probability_table, edges
+
+
+INVALID_NAME = re.compile(r'[\s,;(){}|\[\]]')
+
+
+def _names(dag) -> Dict[str, List[str]]:
+    """The values of every node as strings, these have to be valid bif identifiers."""
+    names = {}
+    for node in dag.nodes:
+        names[node] = [str(v) for v in dag.domains[node]]
+        for name in [str(node)] + names[node]:
+            if name == '' or INVALID_NAME.search(name):
+                raise ValueError(f"`{name}` of node {node} cannot be written, it contains spaces or separators")
+    return names
+
+
+def _format_rows(values: np.ndarray, separator: str = ', ') -> List[str]:
+    """Formats a 2d array into one string per row, each row is formatted by a single call."""
+    template = separator.join(['%r'] * values.shape[1])
+    return [template % row for row in map(tuple, values.tolist())]
+
+
+def _write(chunks: Iterator[str], path: Optional[Union[str, TextIO]]) -> Optional[str]:
+    """Writes the chunks to a path or an open file, or returns them as a string if `path` is `None`."""
+    if path is None:
+        return ''.join(chunks)
+    if isinstance(path, str):
+        with open(path, 'w') as f:
+            f.writelines(chunks)
+    else:
+        path.writelines(chunks)
+
+
+def _bif_chunks(dag, network: str) -> Iterator[str]:
+    names = _names(dag)
+    yield f'network {network} {{\n}}\n'
+    for node in dag.nodes:
+        yield (f'variable {node} {{\n  type discrete [ {len(names[node])} ] {{ {", ".join(names[node])} }};\n}}\n')
+    for node in dag.nodes:
+        factor = dag.factor(node)
+        parents = [v for v in factor.variables if v != node]
+        values = factor.transpose(parents + [node]).values.reshape(-1, len(names[node]))
+        rows = _format_rows(values)
+        if not parents:
+            yield f'probability ( {node} ) {{\n  table {rows[0]};\n}}\n'
+            continue
+        keys = [', '.join(k) for k in it.product(*[names[p] for p in parents])]
+        body = ''.join([f'  ({k}) {r};\n' for k, r in zip(keys, rows)])
+        yield f'probability ( {node} | {", ".join(str(p) for p in parents)} ) {{\n{body}}}\n'
+
+
+def write_bif(dag, path: Optional[Union[str, TextIO]] = None, network: str = 'unknown') -> Optional[str]:
+    """
+    Writes the probability tables of a DAG in the Bayesian Interchange Format (bif).
+    The rows of every table are formatted in one go, numbers are written with the
+    shortest representation that reads back to the same float. All values are
+    written as text, so reading the file back gives string values.
+
+    ## Inputs
+
+    - **dag**: the `DAG` to write, it can be made from data or from probability tables
+    - **path**: path or open file to write to, if it is `None` the bif is returned as a string
+    - **network**: the name of the network
+
+    ## Example
+
+    ```
+    from brent import DAG
+    from brent.common import make_fake_df
+    from brent.parsers import write_bif
+
+    dag = DAG(make_fake_df(4)).add_edge("a", "b").add_edge("b", "c").cache()
+    write_bif(dag, "model.bif")
+    ```
+    """
+    return _write(_bif_chunks(dag, network), path)
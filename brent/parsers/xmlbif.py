@@ -0,0 +1,116 @@
+import io
+import logging
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape
+from typing import Tuple, List, Dict, Iterator, Union, TextIO, Optional
+
+import numpy as np
+
+from brent.factor import Factor
+from brent.parsers.bif import _format_rows, _write
+
+logger = logging.getLogger(__name__)
+
+
+def _text(element: ET.Element, tag: str) -> str:
+    child = element.find(tag)
+    if child is None or child.text is None:
+        raise ValueError(f"<{element.tag}> without <{tag}>")
+    return child.text.strip()
+
+
+def xmlbif_factors(xmlbif: Union[str, TextIO]) -> Tuple[Dict[str, Factor], List[Tuple[str, str]]]:
+    """
+    Parses an XMLBIF string or open file into one probability table per variable and
+    a set of links, just like `brent.parsers.bif_factors`. The file is read incrementally and every
+    `<VARIABLE>` and `<DEFINITION>` element is discarded once it is converted. The
+    values of each table are converted with a single numpy call.
+
+    ## Inputs
+
+    - **xmlbif**: an XMLBIF string or an open file
+
+    ## Example
+
+    ```
+    from brent import DAG
+    from brent.parsers import xmlbif_factors
+
+    with open("dog-problem.xml") as f:
+        factors, links = xmlbif_factors(f)
+    dag = DAG.from_cpts(links, factors)
+    ```
+    """
+    if isinstance(xmlbif, str):
+        xmlbif = io.StringIO(xmlbif)
+    variable_states, factors, edges = {}, {}, []
+    for _, element in ET.iterparse(xmlbif, events=('end',)):
+        if element.tag == 'VARIABLE':
+            name = _text(element, 'NAME')
+            variable_states[name] = tuple(o.text.strip() for o in element.findall('OUTCOME'))
+            logger.info(f'Found variable: {name} with states {variable_states[name]}')
+            element.clear()
+        elif element.tag in ['DEFINITION', 'PROBABILITY']:
+            name = _text(element, 'FOR')
+            given = [g.text.strip() for g in element.findall('GIVEN')]
+            variables = given + [name]
+            missing = [v for v in variables if v not in variable_states]
+            if missing:
+                raise ValueError(f"definition of {name} uses undeclared variables {missing}")
+            try:
+                values = np.array(_text(element, 'TABLE').split(), dtype=float)
+            except ValueError:
+                raise ValueError(f"table of {name} does not only contain numbers")
+            shape = tuple(len(variable_states[v]) for v in variables)
+            if values.size != np.prod(shape):
+                raise ValueError(f"table of {name} has {values.size} values but {int(np.prod(shape))} are expected")
+            factors[name] = Factor(variables, variable_states, values.reshape(shape))
+            edges += [(g, name) for g in given]
+            element.clear()
+    missing = [v for v in variable_states if v not in factors]
+    if missing:
+        raise ValueError(f"variables {missing} do not have a definition")
+    return {v: factors[v] for v in variable_states}, edges
+
+
+def _xmlbif_chunks(dag, network: str) -> Iterator[str]:
+    names = {n: [escape(str(v)) for v in dag.domains[n]] for n in dag.nodes}
+    yield f'<?xml version="1.0"?>\n<BIF VERSION="0.3">\n<NETWORK>\n<NAME>{escape(network)}</NAME>\n'
+    for node in dag.nodes:
+        outcomes = ''.join([f'  <OUTCOME>{v}</OUTCOME>\n' for v in names[node]])
+        yield f'<VARIABLE TYPE="nature">\n  <NAME>{escape(str(node))}</NAME>\n{outcomes}</VARIABLE>\n'
+    for node in dag.nodes:
+        factor = dag.factor(node)
+        parents = [v for v in factor.variables if v != node]
+        values = factor.transpose(parents + [node]).values.reshape(-1, len(names[node]))
+        given = ''.join([f'  <GIVEN>{escape(str(p))}</GIVEN>\n' for p in parents])
+        table = ' '.join(_format_rows(values, separator=' '))
+        yield f'<DEFINITION>\n  <FOR>{escape(str(node))}</FOR>\n{given}  <TABLE>{table}</TABLE>\n</DEFINITION>\n'
+    yield '</NETWORK>\n</BIF>\n'
+
+
+def write_xmlbif(dag, path: Optional[Union[str, TextIO]] = None, network: str = 'unknown') -> Optional[str]:
+    """
+    Writes the probability tables of a DAG in the XMLBIF format. In every table the
+    variable itself changes fastest, followed by the last parent, like in the format
+    specification. All values are written as text, so reading the file back gives
+    string values.
+
+    ## Inputs
+
+    - **dag**: the `DAG` to write, it can be made from data or from probability tables
+    - **path**: path or open file to write to, if it is `None` the XML is returned as a string
+    - **network**: the name of the network
+
+    ## Example
+
+    ```
+    from brent import DAG
+    from brent.common import make_fake_df
+    from brent.parsers import write_xmlbif
+
+    dag = DAG(make_fake_df(4)).add_edge("a", "b").add_edge("b", "c").cache()
+    write_xmlbif(dag, "model.xml")
+    ```
+    """
+    return _write(_xmlbif_chunks(dag, network), path)
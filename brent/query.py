@@ -4,13 +4,18 @@ main object that you'll use to describe complex queries against
 casual graphs.
 """
 
+import copy
 import logging
 
 import numpy as np
+import pandas as pd
+import networkx as nx
 from graphviz import Digraph
 
 from brent.graph import DAG
-from brent.common import normalise
+from brent.factor import Factor
+from brent.inference import JunctionTree, variable_elimination, indicator, prune
+from brent.sampling import likelihood_weighting, gibbs_sampling, r_hat
 
 
 class Query:
@@ -46,27 +51,32 @@ class Query:
         self.given_dict = given
         self.do_dict = do
 
+    def _key(self):
+        return self.dag.fingerprint, frozenset(self.given_dict.items()), frozenset(self.do_dict.items())
+
+    def __eq__(self, other):
+        return isinstance(other, Query) and (self._key() == other._key())
+
+    def __hash__(self):
+        return hash(self._key())
+
     def inference_dag(self):
         """
         This is a DAG created from the original but has been altered
-        to accomodate `do-calculus`.
+        to accomodate `do-calculus`. Without any `do` operations the original
+        DAG is used as is, otherwise the graph surgery of `DAG.intervene` is
+        applied which keeps the cached probability tables of all other nodes.
         """
-        infer_dag = DAG(self.dag.df.copy())
-        logging.debug(f"constructing copy of original DAG nodes: {infer_dag.nodes}")
-        for n1, n2 in self.dag.edges:
-            if n2 not in self.do_dict.keys():
-                infer_dag.add_edge(n1, n2)
-            else:
-                logging.debug(f"edge {n1} -> {n2} ignored because of do operator")
-        logging.debug(f"original DAG copied")
-        return infer_dag
+        if len(self.do_dict) == 0:
+            return self.dag
+        return self.dag.intervene(self.do_dict)
 
     def _check_query_input(self, **kwargs):
         for key, value in kwargs.items():
             logging.debug(f"checking key {key}={value}")
             if key not in self.dag.nodes:
                 raise ValueError(f"node {key} does not exist in original dag")
-            if value not in self.dag.df[key].values:
+            if value not in self.dag.domain_index[key]:
                 raise ValueError(f"value {value} does not occur for node {key}")
             if key in {**self.given_dict, **self.do_dict}.keys():
                 raise ValueError(f"{key} is already used in this query")
@@ -121,7 +131,7 @@ class Query:
                 d.edge(n1, n2)
         return d
 
-    def infer(self, give_table=False):
+    def infer(self, give_table=False, method="exact", targets=None, **kwargs):
         """
         Run the inference on the graph given the current query.
 
@@ -129,31 +139,204 @@ class Query:
 
         - **give_table**: Instead of calculating marginal probabilities and
         returning a dictionary, return a pandas table instead. Defaults to `False`.
+        - **method**: either `"exact"` or `"gibbs"`. Exact inference uses the junction
+        tree if the DAG is compiled via `DAG.compile()` and variable elimination otherwise.
+        Gibbs sampling gives an approximate answer in bounded time when exact
+        inference is too expensive. Defaults to `"exact"`.
+        - **targets**: the nodes to return marginal probabilities for, defaults to all
+        nodes. Exact inference without a junction tree only looks at the part of
+        the graph that is relevant for these nodes; for all nodes a temporary junction
+        tree is built instead, so all marginals follow from one calibration.
+        - **kwargs**: only used when `method="gibbs"`, these are passed to
+        `brent.sampling.gibbs_sampling` (`n_samples`, `chains`, `burn_in`, `thin`, `n_jobs`
+        and `random_state`). Pass `diagnostics=True` to get a tuple `(result, diagnostics)`
+        where `diagnostics["r_hat"]` contains the R-hat value of every sampled node, this
+        needs at least 2 chains. Passing these with another method raises a `ValueError`.
+
+        If the cache of the DAG is enabled via `DAG.enable_cache()` the results of
+        exact inference are stored and reused for equal queries.
+
+        ## Example
+
+        ```
+        from brent import DAG, Query
+        from brent.common import make_fake_df
+
+        dag = DAG(make_fake_df(4)).add_edge("a", "b").add_edge("b", "c").add_edge("c","d")
+        result, diagnostics = Query(dag).given(d=1).infer(method="gibbs", chains=4, diagnostics=True)
+        ```
         """
+        if kwargs and (method != "gibbs"):
+            raise ValueError(f"arguments {sorted(kwargs)} are only used with method='gibbs'")
+        cache = self.dag.query_cache
+        if (cache is None) or (method != "exact"):
+            return self._infer(give_table=give_table, method=method, targets=targets, **kwargs)
+        key = (self, give_table, None if targets is None else tuple(targets))
+        result = cache.get(key)
+        if result is None:
+            result = self._infer(give_table=give_table, method=method, targets=targets)
+            cache.put(key, result)
+        return copy.deepcopy(result)
+
+    def _infer(self, give_table=False, method="exact", targets=None, **kwargs):
         logging.debug(f"about to make an inference")
-        infer_dag = self.inference_dag()
-        for node in infer_dag.nodes:
-            logging.debug(f"confirming parents({node}) = {infer_dag.parents(node)}")
-        marginal_table = infer_dag.marginal_table
-        for k, v in {**self.do_dict, **self.given_dict}.items():
-            logging.debug(f"processing {k}={v}")
-            marginal_table = marginal_table.loc[lambda d: d[k] == v]
-        tbl = marginal_table.assign(prob=lambda d: normalise(d.prob))
+        if method == "gibbs":
+            return self._infer_gibbs(give_table=give_table, targets=targets, **kwargs)
+        if method != "exact":
+            raise ValueError(f"method should be either 'exact' or 'gibbs', got {method}")
+        evidence = {**self.do_dict, **self.given_dict}
+        if give_table:
+            targets = [n for n in self.dag.nodes if n not in evidence.keys()]
+            factors = self._factors().values()
+            tbl = variable_elimination(factors, targets=targets, evidence=evidence).to_frame(drop_zeros=True)
+            for k, v in evidence.items():
+                tbl[k] = v
+            return tbl[self.dag.nodes + ["prob"]]
+        if self.dag.junction_tree is not None:
+            marginals = self.dag.junction_tree.query(evidence=self.given_dict, do=self.do_dict)
+        elif targets is None:
+            tree = JunctionTree({node: self.dag.factor(node) for node in self.dag.nodes})
+            marginals = tree.query(evidence=self.given_dict, do=self.do_dict)
+        else:
+            factors = self._factors()
+            marginals = {node: variable_elimination(prune(factors, [node], evidence).values(),
+                                                    targets=[node], evidence=evidence)
+                         for node in targets if node not in evidence.keys()}
+        output = {node: {evidence[node]: 1.0} for node in evidence.keys()}
+        for node, posterior in marginals.items():
+            output[node] = dict(zip(posterior.domains[node], posterior.values))
+        return {node: output[node] for node in (self.dag.nodes if targets is None else targets)}
+
+    def infer_many(self, evidence, targets, max_cells=1000000):
+        """
+        Run the inference for many evidence assignments at once. Every row of
+        `evidence` is treated as extra `given` values on top of this query, missing
+        values in a row mean that the node is not observed for that row.
+
+        Rows are grouped by the columns they observe. Per group we calculate the
+        distribution of the target given the observed columns once and look up the
+        rows in it, observed columns that are d-separated from the target are skipped.
+        If that table would get larger than `max_cells` we fall back to one inference
+        per unique combination of observed values instead.
+
+        ## Inputs
+
+        - **evidence**: dataframe where every column is a node in the DAG
+        - **targets**: name of a node or list of nodes to infer
+        - **max_cells**: largest lookup table to create per target and group of rows
+
+        ## Output
+
+        If `targets` is a single node, a numpy array with one row per row of `evidence`
+        and one column per value in `dag.domains[target]`. For a list of nodes a
+        dictionary that maps each of them to such an array.
+
+        ## Example
+
+        ```
+        from brent import DAG, Query
+        from brent.common import make_fake_df
+
+        df = make_fake_df(4)
+        dag = DAG(df).add_edge("a", "b").add_edge("b", "c").add_edge("c","d")
+        Query(dag).infer_many(df[["a", "d"]], targets="b")
+        ```
+        """
+        single = not isinstance(targets, (list, tuple))
+        targets = [targets] if single else list(targets)
+        codes = self._encode_evidence(evidence, targets)
+        observed = np.stack([codes[c] >= 0 for c in evidence.columns] + [np.ones(len(evidence), bool)], axis=1)
+        patterns, pattern_idx = np.unique(observed, axis=0, return_inverse=True)
+        output = {t: np.zeros((len(evidence), len(self.dag.domains[t]))) for t in targets}
+        factors = self._factors()
+        for pattern_nr, pattern in enumerate(patterns):
+            rows = np.flatnonzero(pattern_idx.reshape(-1) == pattern_nr)
+            columns = [c for c, o in zip(evidence.columns, pattern) if o]
+            logging.debug(f"inferring {len(rows)} rows that observe {columns}")
+            observed_codes = {c: codes[c][rows] for c in columns}
+            for target in targets:
+                output[target][rows] = self._posterior_rows(target, observed_codes, factors, max_cells)
+        return output[targets[0]] if single else output
+
+    def _encode_evidence(self, evidence, targets):
+        codes = {}
+        for column in evidence.columns:
+            if column not in self.dag.nodes:
+                raise ValueError(f"node {column} does not exist in original dag")
+            if column in targets or column in {**self.given_dict, **self.do_dict}.keys():
+                raise ValueError(f"{column} is already used in this query")
+            codes[column] = self.dag.encode(column, evidence[column])
+            if ((codes[column] < 0) & evidence[column].notna().values).any():
+                raise ValueError(f"column {column} contains values that do not occur for node {column}")
+        return codes
+
+    def _posterior_rows(self, target, codes, factors, max_cells):
+        domain = self.dag.domains[target]
+        if target in {**self.given_dict, **self.do_dict}.keys():
+            return (np.asarray(domain) == {**self.given_dict, **self.do_dict}[target]).astype(float)
+        evidence = {**self.do_dict, **self.given_dict}
+        relevant = prune(factors, [target], {**dict.fromkeys(codes), **evidence})
+        columns = [c for c in codes.keys() if any(c in f.variables for f in relevant.values())]
+        if not columns or np.prod([len(self.dag.domains[c]) for c in columns + [target]]) <= max_cells:
+            table = variable_elimination(prune(factors, columns + [target], evidence).values(),
+                                         targets=columns + [target], evidence=evidence)
+            return table.normalise([target]).values[tuple(codes[c] for c in columns)]
+        combinations, inverse = np.unique(np.stack([codes[c] for c in columns], axis=1), axis=0, return_inverse=True)
+        posteriors = []
+        for combination in combinations:
+            given = {**evidence, **{c: self.dag.domains[c][i] for c, i in zip(columns, combination)}}
+            table = variable_elimination(prune(factors, [target], given).values(), targets=[target], evidence=given)
+            posteriors.append(table.normalise([target]).values)
+        return np.asarray(posteriors)[inverse.reshape(-1)]
+
+    def _infer_gibbs(self, give_table=False, targets=None, diagnostics=False, **kwargs):
+        if diagnostics and kwargs.get("chains", 4) < 2:
+            raise ValueError("diagnostics=True needs at least 2 chains to calculate R-hat")
+        factors = {node: self.dag.factor(node) for node in self.dag.nodes}
+        order = list(nx.topological_sort(self.dag.graph))
+        codes = gibbs_sampling(factors, order, evidence=self.given_dict, do=self.do_dict, **kwargs)
+        evidence = {**self.do_dict, **self.given_dict}
         if give_table:
-            return tbl
-        output = {}
-        for c in tbl.columns:
-            if c != "prob":
-                output[c] = tbl.groupby(c)['prob'].sum().to_dict()
-        return output
+            samples = pd.DataFrame({n: np.asarray(self.dag.domains[n])[c.ravel()] for n, c in codes.items()})
+            for k, v in evidence.items():
+                samples[k] = v
+            result = samples.groupby(self.dag.nodes).size().div(len(samples)).rename("prob").reset_index()
+        else:
+            output = {node: {evidence[node]: 1.0} for node in evidence.keys()}
+            for node, c in codes.items():
+                counts = np.bincount(c.ravel(), minlength=len(self.dag.domains[node]))
+                output[node] = dict(zip(self.dag.domains[node], counts / c.size))
+            result = {node: output[node] for node in (self.dag.nodes if targets is None else targets)}
+        if diagnostics:
+            return result, {"r_hat": {n: r_hat(c, len(self.dag.domains[n])) for n, c in codes.items()}}
+        return result
+
+    def _factors(self):
+        """
+        The probability tables that are used for inference. Nodes with a `do`
+        operation lose their parents, so their table is replaced by one that
+        puts all probability on the enforced value.
+        """
+        factors = {node: self.dag.factor(node) for node in self.dag.nodes}
+        for name, value in self.do_dict.items():
+            factors[name] = indicator(self.dag.domains, name, value)
+        return factors
 
-    def sample(self, n_samples=1):
+    def sample(self, n_samples=1, random_state=None, weighted=False):
         """
-        Sample data from the current query.
+        Sample data from the current query. The samples are drawn node by node
+        from the probability tables in topological order. Nodes with a `do`
+        operation are fixed to their value and given nodes are handled via
+        likelihood weighting.
 
         ## Inputs
 
         - **n_samples**: the number of samples to get
+        - **random_state**: seed or `numpy.random.Generator` to use
+        - **weighted**: if `True` the likelihood weighted samples are returned
+        together with a `weight` column, otherwise the samples are resampled
+        according to their weights such that every row is equally likely.
+        Defaults to `False`.
 
         ## Output
 
@@ -171,12 +354,21 @@ class Query:
         dag = DAG(df).add_edge("a", "b").add_edge("b", "c").add_edge("c","d")
         # we can build a query dynamically
         q1 = Query().given(a=1).do(d=1)
-        q1.sample(100)
+        q1.sample(100, random_state=42)
         ```
         """
-        table = self.infer(give_table=True)
-        idx = np.random.choice(table.index, p=table.prob, replace=True, size=n_samples)
-        return table.loc[idx].reset_index(drop=True).drop(columns=['prob'])
+        rng = np.random.default_rng(random_state)
+        factors = {node: self.dag.factor(node) for node in self.dag.nodes}
+        order = list(nx.topological_sort(self.dag.graph))
+        codes, weights = likelihood_weighting(factors, order, n_samples, evidence=self.given_dict,
+                                              do=self.do_dict, random_state=rng)
+        if weights.sum() == 0:
+            raise ValueError("none of the samples agree with the given values")
+        samples = pd.DataFrame({n: np.asarray(self.dag.domains[n])[codes[n]] for n in self.dag.nodes})
+        if weighted:
+            return samples.assign(weight=weights / weights.sum())
+        idx = rng.choice(n_samples, p=weights / weights.sum(), replace=True, size=n_samples)
+        return samples.loc[idx].reset_index(drop=True)
 
 
 class SupposeQuery:
@@ -201,13 +393,14 @@ class SupposeQuery:
             suppose_given = dict()
         self.suppose_do_dict = suppose_do
         self.suppose_given_dict = suppose_given
+        self._abducted = None
 
     def _check_query_input(self, **kwargs):
         for key, value in kwargs.items():
             logging.debug(f"checking key {key}={value}")
             if key not in self.dag.nodes:
                 raise ValueError(f"node '{key}' does not exist in original dag")
-            if value not in self.dag.df[key].values:
+            if value not in self.dag.domain_index[key]:
                 raise ValueError(f"value {value} does not occur for node {key}")
             if key in {**self.suppose_do_dict, **self.suppose_given_dict}.keys():
                 raise ValueError(f"{key} is already used in this query")
@@ -215,17 +408,9 @@ class SupposeQuery:
     def inference_dag(self):
         """
         This is a DAG created from the original but has been altered
-        to accomodate `do-calculus`.
+        to accomodate `do-calculus`, see `DAG.intervene`.
         """
-        infer_dag = DAG(self.dag.df.copy())
-        logging.debug(f"constructing copy of original DAG nodes: {infer_dag.nodes}")
-        for n1, n2 in self.dag.edges:
-            if n2 not in self.suppose_do_dict.keys():
-                infer_dag.add_edge(n1, n2)
-            else:
-                logging.debug(f"edge {n1} -> {n2} ignored because of do operator")
-        logging.debug(f"original DAG copied")
-        return infer_dag
+        return self.dag.intervene(self.suppose_do_dict)
 
     def when(self, query):
         """
@@ -251,8 +436,10 @@ class SupposeQuery:
         - **kwargs**: key-value pairs of given items.
         """
         self._check_query_input(**kwargs)
-        return SupposeQuery(dag=self.dag, when=self.orig_query, suppose_do={**self.suppose_do_dict, **kwargs},
-                            suppose_given=self.suppose_given_dict)
+        query = SupposeQuery(dag=self.dag, when=self.orig_query, suppose_do={**self.suppose_do_dict, **kwargs},
+                             suppose_given=self.suppose_given_dict)
+        query._abducted = self._abducted
+        return query
 
     def suppose_given(self, **kwargs):
         """
@@ -265,8 +452,62 @@ class SupposeQuery:
         - **kwargs**: key-value pairs of given items.
         """
         self._check_query_input(**kwargs)
-        return SupposeQuery(dag=self.dag, when=self.orig_query, suppose_do=self.suppose_do_dict,
-                            suppose_given={**self.suppose_given_dict, **kwargs})
+        query = SupposeQuery(dag=self.dag, when=self.orig_query, suppose_do=self.suppose_do_dict,
+                             suppose_given={**self.suppose_given_dict, **kwargs})
+        query._abducted = self._abducted
+        return query
+
+    def abducted_dag(self):
+        """
+        The DAG after the abduction step. The probability table of every node that
+        is not part of the `when` query is replaced by the distribution of the node
+        given its parents and the observations in `when`. Combinations of parent values
+        that are impossible given `when` keep their original probabilities.
+
+        The tables of the original DAG are reused; if the original DAG is compiled via
+        `DAG.compile()` the families of all nodes follow from a single pass over its
+        junction tree and the structure of that tree is shared with the returned DAG.
+        The result is stored together with `DAG.fingerprint`, so it is only calculated
+        again when the original DAG changes, for example via `DAG.partial_fit`.
+        """
+        if self.orig_query is None:
+            raise ValueError("SupposeQuery needs a `when` parameter defined.")
+        fingerprint = self.dag.fingerprint
+        if (self._abducted is None) or (self._abducted[0] != fingerprint):
+            self._abducted = (fingerprint, self._abduct())
+        return self._abducted[1]
+
+    def _abduct(self):
+        when = Query(dag=self.dag, given=self.orig_query.given_dict, do=self.orig_query.do_dict)
+        evidence = {**when.do_dict, **when.given_dict}
+        if len(evidence) == 0:
+            return self.dag
+        factors = when._factors()
+        if self.dag.junction_tree is not None:
+            families = self.dag.junction_tree.families(evidence=when.given_dict, do=when.do_dict)
+        else:
+            families = {}
+            for node in [n for n in self.dag.nodes if n not in evidence.keys()]:
+                free = [v for v in factors[node].variables if v not in evidence.keys()]
+                families[node] = variable_elimination(prune(factors, free, evidence).values(),
+                                                      targets=free, evidence=evidence)
+                for v in factors[node].variables:
+                    if v in evidence.keys():
+                        families[node] = families[node] * indicator(self.dag.domains, v, evidence[v])
+        abducted = {}
+        for node in [n for n in self.dag.nodes if n not in evidence.keys()]:
+            original = factors[node]
+            joint = families[node].transpose(original.variables).values
+            total = joint.sum(axis=original.variables.index(node), keepdims=True)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                values = np.where(total > 0, joint / total, original.values)
+            abducted[node] = Factor(original.variables, original.domains, values)
+        logging.debug(f"abducted the tables of {list(abducted.keys())} given {evidence}")
+        dag = self.dag.with_factors(abducted)
+        if self.dag.junction_tree is not None:
+            dag.junction_tree = copy.copy(self.dag.junction_tree)
+            dag.junction_tree.update(dag.factors)
+        return dag
 
     def infer(self, give_table=False):
         """
@@ -277,22 +518,44 @@ class SupposeQuery:
         - **give_table**: Instead of calculating marginal probabilities and
         returning a dictionary, return a pandas table instead. Defaults to `False`.
         """
-        if self.orig_query is None:
-            raise ValueError("SupposeQuery needs a `when` parameter defined.")
-        dag_copy = self.dag.copy().cache()
-        orig_query_table = self.orig_query.infer(give_table=True)
-        names_to_omit = list(self.orig_query.given_dict.keys()) + list(self.orig_query.do_dict.keys())
-        names_to_join = [n for n in self.orig_query.dag.nodes if n not in names_to_omit]
-
-        for node in names_to_join:
-            associated_table = dag_copy.prob_tables[node]
-            colnames = list(associated_table.columns)
-            res = (orig_query_table[colnames]
-                   .groupby([_ for _ in colnames if _ != "prob"])
-                   .sum()["prob"]
-                   .reset_index())
-            dag_copy.prob_tables[node] = res
-
-        new_query = Query(dag=dag_copy, given=self.suppose_given_dict, do=self.suppose_do_dict)
-
-        return new_query.infer(give_table=give_table)
+        return self.infer_many([dict()], give_table=give_table)[0]
+
+    def infer_many(self, scenarios, give_table=False):
+        """
+        Run the inference for many "what if" scenarios against the same `when` query.
+        The abduction step only happens once, after that every scenario is a normal
+        `Query` on the DAG from `SupposeQuery.abducted_dag`.
+
+        ## Inputs
+
+        - **scenarios**: list of dictionaries with the optional keys `do` and `given`,
+                         these are added to the `suppose_do` and `suppose_given` values
+        - **give_table**: Instead of calculating marginal probabilities and
+        returning a dictionary, return a pandas table instead. Defaults to `False`.
+
+        ## Output
+
+        A list with the result of `Query.infer` for every scenario.
+
+        ## Example
+
+        ```
+        from brent import DAG, Query, SupposeQuery
+        from brent.common import make_fake_df
+
+        dag = DAG(make_fake_df(4)).add_edge("a", "b").add_edge("b", "c").add_edge("c","d").compile()
+        suppose = SupposeQuery(dag).when(Query(dag).given(d=1))
+        suppose.infer_many([{"do": {"b": 0}}, {"do": {"b": 1}}, {"given": {"a": 1}}])
+        ```
+        """
+        dag = self.abducted_dag()
+        results = []
+        for scenario in scenarios:
+            unknown = set(scenario.keys()).difference({"do", "given"})
+            if len(unknown) > 0:
+                raise ValueError(f"scenarios can only contain `do` and `given`, got {unknown}")
+            query = (Query(dag=dag, given=self.suppose_given_dict, do=self.suppose_do_dict)
+                     .given(**scenario.get("given", dict()))
+                     .do(**scenario.get("do", dict())))
+            results.append(query.infer(give_table=give_table))
+        return results
@@ -0,0 +1,179 @@
+"""
+The `brent.sampling` module contains the samplers that are used by
+`brent.query.Query`. They draw values directly from the probability tables
+of the nodes, so they never need the joint probability table.
+"""
+
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+
+def _conditional(factor, name):
+    """Returns the values of a factor with the parents first and the node last, and the parents."""
+    parents = [v for v in factor.variables if v != name]
+    return factor.transpose(parents + [name]).values, parents
+
+
+def draw_codes(probs, rng):
+    """
+    Draws one integer code per row of `probs` via the inverse cumulative distribution.
+    Rows that only contain zeros get code 0, the caller is expected to give these
+    rows a weight of zero.
+
+    ## Inputs
+
+    - **probs**: array of shape `(n_samples, n_values)` with probabilities per row
+    - **rng**: a `numpy.random.Generator`
+    """
+    cumulative = probs.cumsum(axis=1)
+    draws = rng.random((probs.shape[0], 1)) * cumulative[:, -1:]
+    return (cumulative <= draws).sum(axis=1).clip(0, probs.shape[1] - 1)
+
+
+def likelihood_weighting(factors, order, n_samples, evidence=None, do=None, random_state=None):
+    """
+    Draws samples in topological order, all samples at once per node. Nodes with a
+    `do` operation are clamped to their value. Nodes that are observed via `evidence`
+    are clamped too, but every sample is weighted by the probability of the
+    observed value given its sampled parents.
+
+    ## Inputs
+
+    - **factors**: dictionary that maps each node to its `brent.factor.Factor`
+    - **order**: the nodes in topological order
+    - **n_samples**: the number of samples to draw
+    - **evidence**: dictionary of variable-value pairs that are observed
+    - **do**: dictionary of variable-value pairs that are enforced
+    - **random_state**: seed or `numpy.random.Generator`
+
+    ## Output
+
+    A tuple `(codes, weights)` where `codes` maps every node to an array of integer
+    codes into the domain of the node and `weights` is an array of sample weights.
+    """
+    evidence, do = evidence or dict(), do or dict()
+    rng = np.random.default_rng(random_state)
+    codes, weights = {}, np.ones(n_samples)
+    for node in order:
+        domain = factors[node].domains[node]
+        if node in do.keys():
+            codes[node] = np.full(n_samples, domain.index(do[node]))
+            continue
+        values, parents = _conditional(factors[node], node)
+        probs = values[tuple(codes[p] for p in parents)]
+        probs = np.broadcast_to(probs, (n_samples, len(domain)))
+        if node in evidence.keys():
+            codes[node] = np.full(n_samples, domain.index(evidence[node]))
+            weights *= probs[:, codes[node][0]]
+        else:
+            codes[node] = draw_codes(probs, rng)
+            weights *= probs.sum(axis=1) > 0
+    logging.debug(f"drew {n_samples} samples, effective sample size {weights.sum() ** 2 / (weights ** 2).sum()}")
+    return codes, weights
+
+
+def _seeds(random_state, n):
+    """Creates `n` independent seeds from a seed or a `numpy.random.Generator`."""
+    if isinstance(random_state, np.random.Generator):
+        random_state = int(random_state.integers(2 ** 32))
+    return np.random.SeedSequence(random_state).spawn(n)
+
+
+def _gibbs_chain(blankets, state, n_samples, burn_in, thin, seed):
+    """Runs a single Gibbs chain and returns the kept states as an array of codes."""
+    rng = np.random.default_rng(seed)
+    state = dict(state)
+    output = np.empty((n_samples, len(blankets)), dtype=np.intp)
+    for step in range(burn_in + n_samples * thin):
+        for node, tables in blankets.items():
+            probs = 1.0
+            for values, others in tables:
+                probs = probs * values[tuple(state[o] for o in others)]
+            cumulative = np.cumsum(probs)
+            state[node] = min(np.searchsorted(cumulative, rng.random() * cumulative[-1], side="right"),
+                              len(cumulative) - 1)
+        if (step >= burn_in) and ((step - burn_in) % thin == 0):
+            output[(step - burn_in) // thin] = [state[n] for n in blankets.keys()]
+    return output
+
+
+def _markov_blankets(factors, free):
+    """For every free node, the tables of all factors that contain it with the node on the last axis."""
+    blankets = {}
+    for node in free:
+        blankets[node] = []
+        for factor in factors.values():
+            if node in factor.variables:
+                values, others = _conditional(factor, node)
+                blankets[node].append((values, others))
+    return blankets
+
+
+def gibbs_sampling(factors, order, n_samples=1000, chains=4, burn_in=100, thin=1,
+                   evidence=None, do=None, n_jobs=1, random_state=None):
+    """
+    Runs Markov-blanket Gibbs sampling. Every step of a chain resamples each
+    unobserved node from its distribution given the current values of the nodes
+    in its Markov blanket. The chains are independent and start from a likelihood
+    weighted sample, so they can run in parallel in a process pool.
+
+    ## Inputs
+
+    - **factors**: dictionary that maps each node to its `brent.factor.Factor`
+    - **order**: the nodes in topological order
+    - **n_samples**: the number of samples to keep per chain
+    - **chains**: the number of independent chains
+    - **burn_in**: the number of sweeps to discard at the start of each chain
+    - **thin**: only keep every `thin`-th sweep
+    - **evidence**: dictionary of variable-value pairs that are observed
+    - **do**: dictionary of variable-value pairs that are enforced
+    - **n_jobs**: the number of processes to use, defaults to 1
+    - **random_state**: seed or `numpy.random.Generator`
+
+    ## Output
+
+    A dictionary that maps every unobserved node to an array of codes with
+    shape `(chains, n_samples)`.
+    """
+    evidence, do = evidence or dict(), do or dict()
+    seeds = _seeds(random_state, chains + 1)
+    rng = np.random.default_rng(seeds[0])
+    codes, weights = likelihood_weighting(factors, order, 100 * chains, evidence=evidence, do=do, random_state=rng)
+    if weights.sum() == 0:
+        raise ValueError("could not find a starting point that agrees with the given values")
+    starts = rng.choice(len(weights), size=chains, p=weights / weights.sum())
+    free = [n for n in order if n not in evidence.keys() and n not in do.keys()]
+    blankets = _markov_blankets({k: f for k, f in factors.items() if k not in do.keys()}, free)
+    args = [(blankets, {n: codes[n][s] for n in order}, n_samples, burn_in, thin, seed)
+            for s, seed in zip(starts, seeds[1:])]
+    if n_jobs == 1:
+        results = [_gibbs_chain(*a) for a in args]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            results = list(pool.map(_gibbs_chain, *zip(*args)))
+    stacked = np.stack(results)
+    return {node: stacked[:, :, i] for i, node in enumerate(free)}
+
+
+def r_hat(codes, n_values):
+    """
+    Calculates the potential scale reduction factor (R-hat) of Gelman and Rubin
+    for one node. We calculate it for the indicator of every value and return the
+    largest one; values close to 1 suggest that the chains have converged.
+
+    ## Inputs
+
+    - **codes**: array of codes with shape `(chains, n_samples)`
+    - **n_values**: the number of values the node can take
+    """
+    n_samples = codes.shape[1]
+    indicators = codes[:, :, None] == np.arange(n_values)
+    chain_means = indicators.mean(axis=1)
+    between = n_samples * chain_means.var(axis=0, ddof=1)
+    within = indicators.var(axis=1, ddof=1).mean(axis=0)
+    pooled = (n_samples - 1) / n_samples * within + between / n_samples
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ratios = np.where(within > 0, np.sqrt(pooled / within), 1.0)
+    return float(ratios.max())
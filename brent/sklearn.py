@@ -3,12 +3,15 @@ The `sklearn` module contains objects that be used in scikit-learn pipelines.
 In particulate it offers a classifier as well as an imputer.
 """
 
+from functools import reduce
+
 from brent.graph import DAG
 from brent.query import Query
+from brent.sampling import draw_codes
 
 import numpy as np
 import pandas as pd
-from sklearn.base import BaseEstimator, ClassifierMixin
+from sklearn.base import BaseEstimator, ClassifierMixin, TransformerMixin
 
 
 class BrentClassifier(BaseEstimator, ClassifierMixin):
@@ -29,13 +32,11 @@ class BrentClassifier(BaseEstimator, ClassifierMixin):
 
         A classifier that can be used in scikit-learn pipelines.
         """
-        if to_predict not in dag.df.columns:
+        if to_predict not in dag.nodes:
             raise ValueError(f"column {to_predict} not found in DAG {dag}")
         self.dag = dag
         self.to_predict = to_predict
-        self.to_use = [_ for _ in self.dag.df.columns if _ != self.to_predict]
-        self.query = None
-        self.k = self.dag.df[to_predict].nunique()
+        self.to_use = [_ for _ in self.dag.nodes if _ != self.to_predict]
 
     def _check_dataframe(self, X):
         for node in self.dag.nodes:
@@ -44,9 +45,12 @@ class BrentClassifier(BaseEstimator, ClassifierMixin):
 
     def fit(self, X: pd.DataFrame, y):
         """
-        Make the estimator "train". This is a bit verbose since the DAG object
-        is already pretrained. We mainly check if the supplied dataframe given in `X`
-        is consistent with the graph.
+        Make the estimator "train". The DAG object is already pretrained, so we check
+        if the supplied dataframe given in `X` is consistent with the graph and we
+        calculate the distribution of `to_predict` given its Markov blanket. This is
+        stored as a lookup table with one axis per node in the blanket such that
+        predictions only need to index it. The domains of these nodes are stored in
+        `domains_`, so the table stays valid when the DAG is updated later on.
 
         ## Inputs
 
@@ -58,6 +62,12 @@ class BrentClassifier(BaseEstimator, ClassifierMixin):
         A "trained" classifier that can be used in scikit-learn pipelines.
         """
         self._check_dataframe(X)
+        self.blanket_ = sorted(self.dag.markov_blanket(self.to_predict), key=str)
+        family = [self.to_predict] + list(self.dag.children(self.to_predict))
+        joint = reduce(lambda a, b: a * b, [self.dag.factor(n) for n in family])
+        self.table_ = joint.transpose(self.blanket_ + [self.to_predict]).normalise([self.to_predict]).values
+        self.domains_ = {n: joint.domains[n] for n in self.blanket_ + [self.to_predict]}
+        self.classes_ = np.array(self.domains_[self.to_predict])
         return self
 
     def predict(self, X):
@@ -72,7 +82,7 @@ class BrentClassifier(BaseEstimator, ClassifierMixin):
 
         A numpy array containing the predicted classes.
         """
-        return np.argmax(self.predict_proba(X), axis=1)
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
 
     def predict_proba(self, X):
         """
@@ -84,14 +94,107 @@ class BrentClassifier(BaseEstimator, ClassifierMixin):
 
         ## Output
 
-        A numpy array (num_rows, num_classes) containing the predicted classes.
+        A numpy array (num_rows, num_classes) containing the predicted probabilities,
+        the columns follow the order of `classes_`.
         """
         self._check_dataframe(X)
-        predictions = np.zeros((X.shape[0], self.k))
-        for idx, row in X[self.to_use].reset_index(drop=True).iterrows():
-            query = Query(dag=self.dag, given=row.to_dict())
-            table = query.infer(give_table=True).sort_values(self.to_predict)[[self.to_predict, 'prob']]
-            for i, r in table.iterrows():
-                k = r[self.to_predict]
-                predictions[idx, int(k)] = r['prob']
-        return predictions
+        codes = []
+        for node in self.blanket_:
+            code = pd.Categorical(X[node], categories=self.domains_[node]).codes
+            if (code < 0).any():
+                raise ValueError(f"column {node} contains values that do not occur in the DAG")
+            codes.append(code)
+        return np.broadcast_to(self.table_[tuple(codes)], (len(X), self.table_.shape[-1])).copy()
+
+
+class BrentImputer(BaseEstimator, TransformerMixin):
+    """
+    An imputer that fills missing values in the columns of a DAG with values that
+    are inferred from the observed columns in the same row.
+
+    ```
+    import numpy as np
+    from brent import DAG
+    from brent.sklearn import BrentImputer
+    from brent.common import make_fake_df
+
+    df = make_fake_df(4)
+    dag = DAG(df).add_edge("a", "b").add_edge("b", "c").add_edge("c", "d")
+    df_missing = df.assign(b=lambda d: np.where(d["a"] == 1, np.nan, d["b"]))
+    BrentImputer(dag).fit_transform(df_missing)
+    ```
+    """
+    def __init__(self, dag: DAG, method="map", max_cells=1000000, random_state=None):
+        """
+        Construct an imputer based on a DAG.
+
+        ## Inputs
+
+        - **dag**: DAG object that describes the dag
+        - **method**: `map` fills in the most likely value, `sample` draws a value
+                      from the distribution given the observed columns
+        - **max_cells**: largest lookup table to create per column and missingness pattern,
+                         see `brent.query.Query.infer_many`
+        - **random_state**: seed or `numpy.random.Generator`, only used when sampling
+
+        ## Output
+
+        A transformer that can be used in scikit-learn pipelines.
+        """
+        if method not in ["map", "sample"]:
+            raise ValueError(f"method must be 'map' or 'sample', got {method}")
+        self.dag = dag
+        self.method = method
+        self.max_cells = max_cells
+        self.random_state = random_state
+
+    def fit(self, X: pd.DataFrame, y=None):
+        """
+        Make the imputer "train". The DAG object is already pretrained, so we only
+        check that the columns of the DAG occur in `X`.
+
+        ## Inputs
+
+        - **X**: a dataframe to be used
+        - **y**: ignored but required by the api
+        """
+        for node in self.dag.nodes:
+            if node not in X.columns:
+                raise ValueError(f"column {node} not in dataframe but in DAG")
+        return self
+
+    def transform(self, X: pd.DataFrame):
+        """
+        Fill in the missing values. Every column is handled separately; the rows that
+        miss a value are passed to `Query.infer_many` which groups them by the columns
+        that are observed, so every missingness pattern is only inferred once. Rows
+        where the observed values are impossible according to the DAG keep their
+        missing value. Columns that are not in the DAG are left alone. The probability
+        tables of the DAG are calculated once and shared by all columns.
+
+        ## Inputs
+
+        - **X**: a dataframe to be used
+
+        ## Output
+
+        A copy of `X` with the missing values filled in.
+        """
+        self.fit(X)
+        rng = np.random.default_rng(self.random_state)
+        result = X.copy()
+        dag = self.dag.with_factors({})
+        for node in self.dag.nodes:
+            missing = X[node].isna().values
+            if not missing.any():
+                continue
+            evidence = X.loc[missing, [n for n in self.dag.nodes if n != node]].reset_index(drop=True)
+            probs = Query(dag).infer_many(evidence, targets=node, max_cells=self.max_cells)
+            if self.method == "map":
+                codes = probs.argmax(axis=1)
+            else:
+                codes = draw_codes(probs, rng)
+            possible = probs.sum(axis=1) > 0
+            rows = np.flatnonzero(missing)[possible]
+            result.iloc[rows, result.columns.get_loc(node)] = np.asarray(self.dag.domains[node])[codes[possible]]
+        return result
@@ -2,6 +2,7 @@ import pytest
 import pandas as pd
 
 from brent.graph import DAG
+from brent.query import Query
 
 
 @pytest.fixture
@@ -21,3 +22,30 @@ def test_after_bake_calc_node_still_works(basic_dag):
 def test_after_bake_no_graph_changes_allowed(basic_dag):
     with pytest.raises(RuntimeError):
         basic_dag.cache().add_edge("d", "e")
+
+
+def test_partial_fit_equals_refit(basic_dag):
+    new_rows = pd.DataFrame({"a": [1, 0], "b": [1, 1], "c": [0, 0], "d": [1, 0], "e": [0, 1]})
+    refit = DAG(pd.concat([basic_dag.df, new_rows])).add_edge("a", "b").add_edge("a", "c").add_edge("c", "b").cache()
+    basic_dag.partial_fit(new_rows)
+    for node in basic_dag.nodes:
+        assert basic_dag.counts[node].transpose(refit.counts[node].variables).values.tolist() == \
+            refit.counts[node].values.tolist()
+
+
+def test_partial_fit_new_values_grow_domain(basic_dag):
+    new_rows = pd.DataFrame({"a": [2], "b": [1], "c": [0], "d": [1], "e": [0]})
+    basic_dag.partial_fit(new_rows)
+    assert basic_dag.domains["a"] == (0, 1, 2)
+    assert basic_dag.counts["a"].values.tolist() == [4, 4, 1]
+    assert Query(basic_dag).infer()["a"][2] == pytest.approx(1 / 9)
+
+
+def test_partial_fit_decay_and_window(basic_dag):
+    new_rows = pd.DataFrame({"a": [1], "b": [1], "c": [0], "d": [1], "e": [0]})
+    decayed = basic_dag.copy().partial_fit(new_rows, decay=0.5)
+    assert decayed.counts["a"].values.tolist() == [2, 3]
+    windowed = basic_dag.copy().partial_fit(new_rows, window=2).partial_fit(new_rows, window=2)
+    assert windowed.counts["a"].values.tolist() == [0, 2]
+    with pytest.raises(ValueError):
+        basic_dag.partial_fit(new_rows, decay=0.5, window=2)
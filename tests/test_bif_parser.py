@@ -1,9 +1,11 @@
+import io
+
 import pandas as pd
 import pytest
 
-from brent import parsers
+from brent import parsers, DAG, Query
 from brent.parsers.bif import parse_network_type, parse_variables, \
-    parse_unconditional_probabilities, parse_conditional_probabilities
+    parse_unconditional_probabilities, parse_conditional_probabilities, parse_blocks
 
 
 @pytest.fixture
@@ -98,3 +100,108 @@ def test_parse_conditional_variables(test_bif):
         ]),
     ]
     assert list(parse_conditional_probabilities(test_bif)) == target
+
+
+def test_parse_from_file_object(test_bif, tmp_path):
+    path = tmp_path / "test.bif"
+    path.write_text(test_bif)
+    with open(path) as f:
+        probability_df, links = parsers.bif(f)
+    expected_df, expected_links = parsers.bif(test_bif)
+    pd.testing.assert_frame_equal(probability_df, expected_df)
+    assert links == expected_links
+
+
+def test_parse_blocks(test_bif):
+    blocks = list(parse_blocks(test_bif.replace("network unknown {\n}", "network unknown {}")))
+    assert [b.kind for b in blocks] == ["network"] + ["variable"] * 4 + ["probability"] * 4
+    assert blocks[6].name == "C" and blocks[6].line == 17
+    assert blocks[6].keys == [("yes",), ("no",)]
+    assert blocks[6].probabilities.shape == (2, 2)
+
+
+@pytest.mark.parametrize("old,new", [
+    ("probability ( A ) {\n  table", "probability ( A ) { table"),
+    ("table 0.01, 0.99;\n}", "table 0.01, 0.99; }"),
+    ("probability ( A ) {\n  table 0.01, 0.99;\n}", "probability ( A ) { table 0.01, 0.99; }"),
+    ("}\nprobability ( C | B ) {", "} probability ( C | B ) {"),
+    ("(yes) 0.05, 0.95;", "(yes)\n 0.05,\n 0.95;"),
+    ("  (no) 0.01, 0.99;\n}", "  (no) 0.01, 0.99; } // no more rows"),
+    ("variable B {", "variable B\n{"),
+    ("probability ( D | B, A ) {", "probability ( D | B, // parents\n A )\n {"),
+])
+def test_parse_blocks_layouts(test_bif, old, new):
+    assert old in test_bif
+    expected = {b.name: (b.kind, b.keys, b.probabilities) for b in parse_blocks(test_bif)}
+    blocks = list(parse_blocks(test_bif.replace(old, new)))
+    assert [b.kind for b in blocks] == ["network"] + ["variable"] * 4 + ["probability"] * 4
+    for block in blocks[5:]:
+        kind, keys, probabilities = expected[block.name]
+        assert block.keys == keys
+        assert block.probabilities.tolist() == probabilities.tolist()
+
+
+def test_parse_blocks_wrapped_header(test_bif):
+    blocks = list(parse_blocks(test_bif.replace("probability ( C | B ) {", "probability ( C |\n B ) {")))
+    assert blocks[6].name == "C" and blocks[6].conditionals == ["B"]
+    assert blocks[6].line == 18 and blocks[7].line == 23
+    with pytest.raises(ValueError, match="line 6:"):
+        list(parse_blocks(test_bif.replace("variable B {", "variable B ;")))
+
+
+def test_parse_blocks_missing_semicolon(test_bif):
+    with pytest.raises(ValueError, match="line 16:"):
+        list(parse_blocks(test_bif.replace("table 0.01, 0.99;", "table 0.01, 0.99")))
+
+
+@pytest.mark.parametrize("old,new,line", [
+    ("(no) 0.01, 0.99;", "(no) 0.01, abc;", 20),
+    ("variable B {", "varable B {", 6),
+    ("(no, no) 0.0, 1.0;", "(no) 0.0, 1.0;", 29),
+    ("type discrete [ 2 ] { yes, no };\n}\nvariable C", "type discrete [ 3 ] { yes, no };\n}\nvariable C", 7),
+])
+def test_parse_errors_mention_line(test_bif, old, new, line):
+    with pytest.raises(ValueError, match=f"line {line}:"):
+        parsers.bif(test_bif.replace(old, new))
+
+
+def test_bif_factors(test_bif):
+    factors, links = parsers.bif_factors(test_bif)
+    assert list(factors.keys()) == ["A", "B", "C", "D"]
+    assert sorted(links) == sorted([("A", "D"), ("B", "D"), ("B", "C")])
+    assert factors["D"].variables == ("B", "A", "D")
+    assert factors["D"].domains["D"] == ("yes", "no")
+    assert factors["D"].values[1, 1].tolist() == [0.0, 1.0]
+    assert factors["D"].values[0, 1].tolist() == [1.0, 0.0]
+
+
+def test_bif_factors_missing_rows(test_bif):
+    with pytest.raises(ValueError, match="line 25:"):
+        parsers.bif_factors(test_bif.replace("  (no, no) 0.0, 1.0;\n", ""))
+
+
+def test_dag_from_bif(test_bif, tmp_path):
+    path = tmp_path / "test.bif"
+    path.write_text(test_bif)
+    dag = DAG.from_bif(str(path))
+    assert dag.df is None
+    assert dag.domains["A"] == ("yes", "no")
+    joint, _ = parsers.bif(test_bif)
+    result = Query(dag).given(D="yes").infer()
+    expected = joint.loc[lambda d: d["D"] == "yes"].groupby("A")["prob"].sum()
+    for value, prob in (expected / expected.sum()).items():
+        assert result["A"][value] == pytest.approx(prob, abs=0.0001)
+
+
+def test_write_bif_roundtrip(test_bif):
+    dag = DAG.from_bif(io.StringIO(test_bif))
+    factors, links = parsers.bif_factors(parsers.write_bif(dag))
+    assert sorted(links) == sorted(dag.edges)
+    for node, factor in factors.items():
+        assert (factor.values == dag.factor(node).transpose(factor.variables).values).all()
+
+
+def test_write_bif_invalid_names():
+    dag = DAG(pd.DataFrame({"a": ["x y", "z"], "b": [1, 2]})).add_edge("a", "b")
+    with pytest.raises(ValueError):
+        parsers.write_bif(dag)
@@ -0,0 +1,55 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from brent import DAG, Query
+from brent.common import make_fake_df, read_chunks
+
+EDGES = [("a", "b"), ("b", "c"), ("a", "d")]
+
+
+@pytest.fixture
+def df():
+    return make_fake_df(nodes=4, rows=1000, values=3)
+
+
+def test_from_chunks_equals_dataframe(df):
+    chunked = DAG.from_chunks((df[i:i + 100] for i in range(0, 1000, 100)), edges=EDGES)
+    full = DAG(df).add_edges(EDGES)
+    assert chunked.df is None
+    assert chunked.domains == full.domains
+    for given, do in [({}, {}), ({"c": 1}, {}), ({"c": 1}, {"a": 2})]:
+        expected = Query(full, given=given, do=do).infer()
+        result = Query(chunked, given=given, do=do).infer()
+        for node in full.nodes:
+            for value, prob in expected[node].items():
+                assert result[node][value] == pytest.approx(prob, abs=0.0001)
+
+
+def test_from_chunks_copy_keeps_tables(df):
+    dag = DAG.from_chunks([df], edges=EDGES).copy()
+    assert dag.cached
+    assert Query(dag).given(a=1).infer()["a"] == {1: 1.0}
+
+
+def test_from_chunks_requires_data():
+    with pytest.raises(ValueError):
+        DAG.from_chunks([], edges=EDGES)
+
+
+def test_read_chunks_npy_directory(df, tmp_path):
+    for col in df.columns:
+        np.save(os.path.join(tmp_path, f"{col}.npy"), df[col].values)
+    chunks = list(read_chunks(str(tmp_path), chunksize=300))
+    assert [len(c) for c in chunks] == [300, 300, 300, 100]
+    pd.testing.assert_frame_equal(pd.concat(chunks).reset_index(drop=True), df)
+
+
+def test_read_chunks_csv(df, tmp_path):
+    path = os.path.join(tmp_path, "data.csv")
+    df.to_csv(path, index=False)
+    chunks = list(read_chunks(path, chunksize=400, columns=["a", "b"]))
+    assert [len(c) for c in chunks] == [400, 400, 200]
+    assert list(chunks[0].columns) == ["a", "b"]
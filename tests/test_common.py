@@ -1,7 +1,7 @@
 import pandas as pd
 import pytest
 
-from brent.common import window, normalise, check_node_blocking, join_independent, join_dependent
+from brent.common import window, normalise, check_node_blocking, join_independent, join_dependent, LRUCache
 
 
 @pytest.fixture
@@ -87,3 +87,16 @@ def test_join_dependent_input_checks(prob_a, cond_prob_b):
 
     with pytest.raises(ValueError):
         join_dependent(prob_a, cond_prob_b.reset_index())
+
+
+def test_lru_cache():
+    cache = LRUCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.info() == {"hits": 2, "misses": 1, "maxsize": 2, "currsize": 2}
+    with pytest.raises(ValueError):
+        LRUCache(maxsize=0)
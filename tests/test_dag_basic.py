@@ -2,6 +2,7 @@ import pytest
 import pandas as pd
 
 from brent.graph import DAG
+from brent.query import Query
 
 
 @pytest.fixture()
@@ -60,3 +61,109 @@ def test_dag_remains_dag(small_df):
     dag = DAG(small_df).add_edge("a", "b").add_edge("b", "c")
     with pytest.raises(ValueError):
         assert dag.add_edge("c", "a")
+
+
+def test_add_edges(small_df):
+    dag = DAG(small_df).add_edges([("a", "b"), ("b", "c")])
+    assert set(dag.edges) == {("a", "b"), ("b", "c")}
+
+
+def test_add_edges_with_cycle_adds_nothing(small_df):
+    dag = DAG(small_df).add_edge("a", "b")
+    with pytest.raises(ValueError):
+        dag.add_edges([("b", "c"), ("c", "a")])
+    assert dag.edges == [("a", "b")]
+    with pytest.raises(ValueError):
+        dag.add_edge("a", "a")
+
+
+def test_domain_index_and_encode(small_df):
+    dag = DAG(small_df.assign(d=["x", "z", "y", "x", "z"]))
+    assert dag.domains["d"] == ("x", "y", "z")
+    assert dag.domain_index["d"] == {"x": 0, "y": 1, "z": 2}
+    assert list(dag.encode("d", ["z", "x", "q", None])) == [2, 0, -1, -1]
+
+
+def test_domain_index_grows_with_partial_fit(small_df):
+    dag = DAG(small_df).add_edge("a", "b").cache()
+    dag.partial_fit(pd.DataFrame({"a": [2], "b": [1], "c": [0]}))
+    assert dag.domain_index["a"] == {0: 0, 1: 1, 2: 2}
+    assert list(dag.encode("a", [2, 0])) == [2, 0]
+
+
+def test_growing_a_copy_leaves_the_original_alone(small_df):
+    dag = DAG(small_df).add_edge("a", "b").cache()
+    other = dag.copy().cache()
+    other.partial_fit(pd.DataFrame({"a": [2], "b": [1], "c": [0]}))
+    assert other.domains["a"] == (0, 1, 2)
+    assert dag.domains["a"] == (0, 1)
+    assert dag.domain_index["a"] == {0: 0, 1: 1}
+    assert dag.factor("b").values.shape == (2, 2)
+
+
+def test_copy_does_not_encode_again(small_df, monkeypatch):
+    dag = DAG(small_df).add_edge("a", "b")
+    encoded = []
+    encode = DAG._encode
+    monkeypatch.setattr(DAG, "_encode", lambda self: encoded.append(len(self.df)) or encode(self))
+    other = dag.copy()
+    assert encoded == [0]
+    assert other.df is dag.df
+    assert other.edges == dag.edges
+    assert (other.factor("b").values == dag.factor("b").values).all()
+
+
+@pytest.mark.parametrize("mmap", [True, False])
+def test_save_and_load(small_df, tmp_path, mmap):
+    dag = DAG(small_df.assign(d=["x", "z", "y", "x", "z"])).add_edge("a", "b").add_edge("d", "c").cache()
+    dag.save(str(tmp_path))
+    loaded = DAG.load(str(tmp_path), mmap=mmap)
+    assert loaded.df is None
+    assert loaded.nodes == dag.nodes
+    assert set(loaded.edges) == set(dag.edges)
+    assert loaded.domains == dag.domains
+    for node in dag.nodes:
+        assert (loaded.factor(node).transpose(dag.factor(node).variables).values == dag.factor(node).values).all()
+    loaded.partial_fit(small_df.assign(d=["x", "z", "y", "x", "z"]))
+    assert loaded.counts["a"].values.sum() == 10
+
+
+@pytest.fixture()
+def cpts():
+    return {"rain": pd.DataFrame({"rain": [0, 1], "prob": [0.8, 0.2]}),
+            "wet": pd.DataFrame({"rain": [0, 0, 1, 1], "wet": [0, 1, 0, 1], "prob": [0.9, 0.1, 0.2, 0.8]})}
+
+
+def test_from_cpts(cpts):
+    dag = DAG.from_cpts(edges=[("rain", "wet")], cpts=cpts, domains={"rain": [1, 0], "wet": [0, 1]})
+    assert dag.df is None
+    assert dag.domains["rain"] == (1, 0)
+    assert dag.factor("wet").variables == ("rain", "wet")
+    assert dag.factor("wet").values.tolist() == [[0.2, 0.8], [0.9, 0.1]]
+    assert dag.calc_node_table("rain").set_index("rain")["prob"].to_dict() == {1: 0.2, 0: 0.8}
+    with pytest.raises(ValueError):
+        dag.partial_fit(pd.DataFrame({"rain": [0], "wet": [0]}))
+
+
+def test_fingerprint_of_dags_without_data(cpts):
+    d1 = DAG.from_cpts(edges=[("rain", "wet")], cpts=cpts)
+    d2 = DAG.from_cpts(edges=[("rain", "wet")], cpts={**cpts, "rain": cpts["rain"].assign(prob=[0.5, 0.5])})
+    assert d1.fingerprint != d2.fingerprint
+    assert Query(d1) != Query(d2)
+    assert Query(d1).given(rain=1) == Query(d1).given(rain=1)
+    assert d1.with_factors({}).fingerprint != d1.fingerprint
+
+
+def test_from_cpts_errors(cpts):
+    with pytest.raises(ValueError):
+        DAG.from_cpts(edges=[], cpts=cpts)
+    with pytest.raises(ValueError):
+        DAG.from_cpts(edges=[("rain", "wet")], cpts={**cpts, "rain": cpts["rain"].assign(prob=[0.5, 0.6])})
+    with pytest.raises(ValueError):
+        DAG.from_cpts(edges=[("rain", "wet")], cpts=cpts, domains={"rain": [0], "wet": [0, 1]})
+    with pytest.raises(ValueError, match="has variables"):
+        DAG.from_cpts(edges=[("rain", "wet")], cpts={**cpts, "wet": cpts["wet"].rename(columns={"rain": "rian"})})
+    with pytest.raises(ValueError, match="has variables"):
+        DAG.from_cpts(edges=[("rain", "wet")], cpts={**cpts, "wet": cpts["wet"].drop(columns="wet")})
+    with pytest.raises(ValueError, match="prob"):
+        DAG.from_cpts(edges=[("rain", "wet")], cpts={**cpts, "rain": cpts["rain"].drop(columns="prob")})
@@ -77,3 +77,21 @@ def test_node_table_throws_value_error(basic_dag):
 
 def test_after_bake_calc_node_still_works(basic_dag):
     basic_dag.cache().calc_node_table("a")
+
+
+def test_family_counts(basic_dag):
+    counts = basic_dag.family_counts("b")
+    assert set(counts.variables) == {"a", "b", "c"}
+    assert counts.values.sum() == basic_dag.df.shape[0]
+    expected = basic_dag.df.groupby(["a", "c", "b"]).size()
+    for (a, c, b), n in expected.items():
+        assert counts.reduce({"a": a, "b": b, "c": c}).values == n
+
+
+def test_calc_node_table_matches_groupby(basic_dag):
+    tbl = basic_dag.calc_node_table("b").set_index(["a", "c", "b"])["prob"]
+    sizes = basic_dag.df.groupby(["a", "c", "b"]).size()
+    expected = sizes / sizes.groupby(level=["a", "c"]).transform("sum")
+    for key, prob in expected.items():
+        assert tbl[key] == approx(prob, abs=0.0001)
+    assert len(tbl) == len(expected)
@@ -1,8 +1,10 @@
+import os
+
 import pytest
 import pandas as pd
 
 from brent.datasets import alarm_dataset, asian_cancer_dataset, blue_baby_dataset, simple_study_dataset, \
-    generate_risk_dataset
+    generate_risk_dataset, register_dataset, get_data_home, SOURCES
 
 
 def test_datasets_load():
@@ -13,3 +15,39 @@ def test_datasets_load():
 def test_risk_dataset_error():
     with pytest.raises(ValueError):
         generate_risk_dataset(attackers=2, defenders=2, battle_size=3)
+
+
+@pytest.fixture
+def local_asia(tmp_path, monkeypatch):
+    monkeypatch.setenv("BRENT_DATA", str(tmp_path / "cache"))
+    monkeypatch.setitem(SOURCES, "asia", SOURCES["asia"])
+    source = tmp_path / "asia.csv"
+    pd.DataFrame({"smoke": ["yes", "no", "no"], "lung": ["no", "no", "yes"]}).to_csv(source, index=False)
+    register_dataset("asia", str(source))
+    return source
+
+
+def test_dataset_is_cached(local_asia):
+    first = asian_cancer_dataset()
+    assert (first.dtypes == "category").all()
+    assert os.path.exists(os.path.join(get_data_home(), "asia.pkl"))
+    local_asia.unlink()
+    pd.testing.assert_frame_equal(asian_cancer_dataset(), first)
+
+
+def test_dataset_cache_checksum(local_asia):
+    asian_cancer_dataset()
+    with open(os.path.join(get_data_home(), "asia.pkl"), "wb") as f:
+        f.write(b"corrupt")
+    assert list(asian_cancer_dataset()["smoke"]) == ["yes", "no", "no"]
+
+
+def test_dataset_refreshes_edited_source(local_asia):
+    asian_cancer_dataset()
+    pd.DataFrame({"smoke": ["no"], "lung": ["yes"]}).to_csv(local_asia, index=False)
+    assert list(asian_cancer_dataset()["smoke"]) == ["no"]
+
+
+def test_register_unknown_dataset():
+    with pytest.raises(ValueError):
+        register_dataset("foobar", "foobar.csv")
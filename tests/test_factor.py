@@ -0,0 +1,66 @@
+import pytest
+import numpy as np
+import pandas as pd
+
+from brent.factor import Factor
+
+
+@pytest.fixture
+def prob_a():
+    return Factor.from_frame(pd.DataFrame({'A': ['true', 'false'], 'prob': [0.5, 0.5]}))
+
+
+@pytest.fixture
+def cond_prob_b():
+    return Factor.from_frame(pd.DataFrame({
+        'A': ['true', 'false', 'true', 'false'],
+        'B': ['true', 'true', 'false', 'false'],
+        'prob': [0.3, 0.7, 0.8, 0.2]}))
+
+
+def test_from_frame_domains_are_sorted(cond_prob_b):
+    assert cond_prob_b.variables == ('A', 'B')
+    assert cond_prob_b.domains['A'] == ('false', 'true')
+    assert cond_prob_b.shape == (2, 2)
+
+
+def test_from_frame_missing_rows_are_zero():
+    frame = pd.DataFrame({'A': [0, 1], 'B': [0, 1], 'prob': [0.5, 0.5]})
+    factor = Factor.from_frame(frame)
+    assert np.allclose(factor.values, [[0.5, 0.0], [0.0, 0.5]])
+
+
+def test_from_frame_unknown_value_raises():
+    frame = pd.DataFrame({'A': [0, 2], 'prob': [0.5, 0.5]})
+    with pytest.raises(ValueError):
+        Factor.from_frame(frame, domains={'A': (0, 1)})
+
+
+def test_roundtrip_frame(cond_prob_b):
+    frame = cond_prob_b.to_frame()
+    assert Factor.from_frame(frame).values.tolist() == cond_prob_b.values.tolist()
+
+
+def test_product_matches_join_dependent(prob_a, cond_prob_b):
+    joint = (prob_a * cond_prob_b).to_frame().set_index(['A', 'B'])['prob']
+    assert joint[('true', 'true')] == pytest.approx(0.15)
+    assert joint[('true', 'false')] == pytest.approx(0.40)
+    assert joint[('false', 'true')] == pytest.approx(0.35)
+    assert joint[('false', 'false')] == pytest.approx(0.10)
+
+
+def test_marginalise_and_reduce(prob_a, cond_prob_b):
+    joint = prob_a * cond_prob_b
+    marginal_b = joint.marginalise(['A'])
+    assert marginal_b.variables == ('B',)
+    assert marginal_b.values.sum() == pytest.approx(1.0)
+    reduced = joint.reduce({'A': 'true'})
+    assert reduced.variables == ('B',)
+    assert reduced.values.tolist() == pytest.approx([0.40, 0.15])
+    with pytest.raises(ValueError):
+        joint.reduce({'A': 'maybe'})
+
+
+def test_conditional_normalise(prob_a, cond_prob_b):
+    conditional = (prob_a * cond_prob_b).normalise(['B'])
+    assert np.allclose(conditional.values.sum(axis=1), 1.0)
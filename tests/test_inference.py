@@ -0,0 +1,73 @@
+import pytest
+import pandas as pd
+
+from brent.graph import DAG
+from brent.query import Query
+from brent.inference import variable_elimination, elimination_order, prune
+
+
+@pytest.fixture
+def basic_dag():
+    df = pd.DataFrame({"a": [1, 1, 1, 1, 0, 0, 0, 0],
+                       "b": [0, 1, 0, 1, 1, 1, 1, 0],
+                       "c": [0, 0, 1, 0, 0, 1, 0, 1],
+                       "d": [1, 1, 0, 1, 0, 0, 0, 0],
+                       "e": [1, 1, 1, 1, 0, 0, 0, 0]})
+    return DAG(df).add_edge("a", "b").add_edge("a", "c").add_edge("c", "b").add_edge("b", "d")
+
+
+def test_elimination_order_chain():
+    scopes = [["a"], ["a", "b"], ["b", "c"], ["c", "d"]]
+    order = elimination_order(scopes, ["a", "b", "c"])
+    assert set(order) == {"a", "b", "c"}
+    assert order[0] == "a"
+
+
+def test_variable_elimination_matches_marginal_table(basic_dag):
+    factors = [basic_dag.factor(n) for n in basic_dag.nodes]
+    marginal = basic_dag.marginal_table
+    for node in basic_dag.nodes:
+        expected = marginal.groupby(node)["prob"].sum()
+        result = variable_elimination(factors, targets=[node]).to_frame().set_index(node)["prob"]
+        for value, prob in expected.items():
+            assert result[value] == pytest.approx(prob, abs=0.0001)
+
+
+def test_infer_give_table_contains_evidence(basic_dag):
+    tbl = Query(basic_dag).given(a=1).do(d=0).infer(give_table=True)
+    assert list(tbl.columns) == basic_dag.nodes + ["prob"]
+    assert (tbl["a"] == 1).all()
+    assert (tbl["d"] == 0).all()
+    assert tbl["prob"].sum() == pytest.approx(1.0, abs=0.0001)
+
+
+@pytest.mark.parametrize("given,do", [({}, {}), ({"a": 1}, {}), ({"d": 0}, {"c": 1}), ({"b": 1}, {"a": 0})])
+def test_junction_tree_matches_variable_elimination(basic_dag, given, do):
+    expected = Query(basic_dag, given=given, do=do).infer(targets=basic_dag.nodes)
+    result = Query(basic_dag.copy().compile(), given=given, do=do).infer()
+    assert result == Query(basic_dag, given=given, do=do).infer()
+    assert set(result.keys()) == set(expected.keys())
+    for node, probs in expected.items():
+        for value, prob in probs.items():
+            assert result[node][value] == pytest.approx(prob, abs=0.0001)
+
+
+def test_junction_tree_follows_partial_fit(basic_dag):
+    dag = basic_dag.compile()
+    dag.partial_fit(pd.DataFrame({"a": [1] * 8, "b": [1] * 8, "c": [0] * 8, "d": [1] * 8, "e": [0] * 8}))
+    assert Query(dag).infer()["a"][1] == pytest.approx(0.75, abs=0.0001)
+
+
+def test_prune_removes_barren_and_separated_nodes(basic_dag):
+    factors = {n: basic_dag.factor(n) for n in basic_dag.nodes}
+    assert set(prune(factors, ["a"])) == {"a"}
+    assert set(prune(factors, ["a"], evidence={"d": 1})) == {"a", "b", "c", "d"}
+    assert set(prune(factors, ["c"], evidence={"a": 1})) == {"c"}
+    assert set(prune(factors, ["e"], evidence={"b": 1})) == {"e"}
+
+
+def test_infer_targets(basic_dag):
+    full = Query(basic_dag).given(d=1).infer()
+    result = Query(basic_dag).given(d=1).infer(targets=["a", "d"])
+    assert list(result.keys()) == ["a", "d"]
+    assert result["a"][1] == pytest.approx(full["a"][1], abs=0.0001)
@@ -62,3 +62,42 @@ def test_path_direction_2(basic_dag):
         assert dag.edge_direction("a", "e")
     with pytest.raises(ValueError):
         assert dag.edge_direction("a", "c")
+
+
+def test_d_separation_chain_fork_collider(basic_dag):
+    dag = (basic_dag
+           .add_edge("a", "b")
+           .add_edge("b", "c")
+           .add_edge("d", "c")
+           .add_edge("c", "e"))
+    assert not dag.is_d_separated("a", "c")
+    assert dag.is_d_separated("a", "c", z=["b"])
+    assert dag.is_d_separated("a", "d")
+    assert not dag.is_d_separated("a", "d", z=["c"])
+    assert not dag.is_d_separated("a", "d", z=["e"])
+    assert dag.active_paths("a", "d") == []
+
+
+def test_d_connected(basic_dag):
+    dag = (basic_dag
+           .add_edge("a", "b")
+           .add_edge("c", "b")
+           .add_edge("b", "d"))
+    assert dag.d_connected("a") == {"b", "d"}
+    assert dag.d_connected("a", z=["b"]) == {"c"}
+    assert dag.d_connected("e") == set()
+    with pytest.raises(ValueError):
+        dag.d_connected("q")
+
+
+def test_independences(basic_dag):
+    dag = (basic_dag
+           .add_edge("a", "c")
+           .add_edge("b", "c")
+           .add_edge("c", "d"))
+    statements = dag.independences()
+    assert ("a", "b", ()) in statements
+    assert ("d", "a", ("c",)) in statements
+    assert ("d", "b", ("c",)) in statements
+    assert all(dag.is_d_separated(a, b, given) for a, b, given in statements)
+    assert dag.independences(pairwise=False, local=False) == []
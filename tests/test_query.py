@@ -90,3 +90,126 @@ def test_query_sample_1(simple_dag, n):
     assert q1.sample(n)["a"].sum() == n
     q0 = Query(simple_dag).given(a=0)
     assert q0.sample(n)["a"].sum() == 0
+
+
+def test_query_sample_seed_and_do(dag):
+    q = Query(dag).given(f=1).do(b=0)
+    s1, s2 = q.sample(500, random_state=42), q.sample(500, random_state=42)
+    pd.testing.assert_frame_equal(s1, s2)
+    assert (s1["f"] == 1).all() and (s1["b"] == 0).all()
+    assert list(s1.columns) == dag.nodes
+
+
+def test_query_sample_matches_inference(simple_dag):
+    q = Query(simple_dag).given(a=0)
+    samples = q.sample(20000, random_state=0)
+    assert samples["b"].mean() == pytest.approx(q.infer()["b"][1], abs=0.02)
+    weighted = q.sample(100, random_state=0, weighted=True)
+    assert weighted["weight"].sum() == pytest.approx(1.0)
+
+
+def test_gibbs_matches_exact(simple_dag):
+    q = Query(simple_dag).given(b=1)
+    exact = q.infer()
+    approx, diagnostics = q.infer(method="gibbs", n_samples=3000, chains=2, burn_in=50,
+                                  random_state=0, diagnostics=True)
+    assert approx["b"] == {1: 1.0}
+    assert approx["a"][1] == pytest.approx(exact["a"][1], abs=0.05)
+    assert set(diagnostics["r_hat"].keys()) == {"a", "c"}
+    assert all(r < 1.1 for r in diagnostics["r_hat"].values())
+
+
+def test_gibbs_unknown_method(simple_dag):
+    with pytest.raises(ValueError):
+        Query(simple_dag).infer(method="magic")
+
+
+def test_gibbs_arguments_need_gibbs(simple_dag):
+    with pytest.raises(ValueError):
+        Query(simple_dag).infer(chains=2)
+    with pytest.raises(ValueError):
+        Query(simple_dag.enable_cache()).infer(n_samples=10)
+
+
+def test_gibbs_diagnostics_need_two_chains(simple_dag):
+    with pytest.raises(ValueError):
+        Query(simple_dag).infer(method="gibbs", chains=1, diagnostics=True)
+
+
+def test_query_hashable(simple_dag):
+    assert Query(simple_dag).given(a=1).do(b=0) == Query(simple_dag).do(b=0).given(a=1)
+    assert hash(Query(simple_dag).given(a=1)) == hash(Query(simple_dag, given={"a": 1}))
+    assert Query(simple_dag).given(a=1) != Query(simple_dag).given(a=0)
+
+
+def test_query_cache_hits_and_invalidation(simple_dag):
+    dag = simple_dag.enable_cache(maxsize=2)
+    first = Query(dag).given(a=1).infer()
+    first["b"][0] = 42
+    assert Query(dag).given(a=1).infer()["b"][0] == pytest.approx(0.5, abs=0.001)
+    assert dag.query_cache.info()["hits"] == 1
+    dag.partial_fit(pd.DataFrame({"a": [1, 1], "b": [0, 0], "c": [0, 0]}))
+    assert Query(dag).given(a=1).infer()["b"][0] == pytest.approx(4 / 6, abs=0.001)
+    assert dag.query_cache.info()["misses"] == 2
+    Query(dag).infer()
+    Query(dag).given(a=0).infer()
+    assert len(dag.query_cache) == 2
+
+
+@pytest.mark.parametrize("max_cells", [1000000, 1])
+def test_infer_many_matches_infer(dag, max_cells):
+    evidence = make_fake_df(7, rows=50, seed=3)[["a", "d", "f"]].astype(float)
+    evidence.iloc[::3, 0] = float("nan")
+    evidence.iloc[::4, 2] = float("nan")
+    result = Query(dag).do(g=1).infer_many(evidence, targets=["c", "g"], max_cells=max_cells)
+    for i, row in evidence.iterrows():
+        given = {k: int(v) for k, v in row.items() if v == v}
+        expected = Query(dag, given=given, do={"g": 1}).infer(targets=["c", "g"])
+        for target in ["c", "g"]:
+            for code, value in enumerate(dag.domains[target]):
+                assert result[target][i, code] == pytest.approx(expected[target].get(value, 0.0), abs=0.0001)
+
+
+@pytest.mark.parametrize("max_cells", [1000000, 1])
+def test_infer_many_builds_factors_once(dag, max_cells, monkeypatch):
+    calls = []
+    factor = dag.factor
+    monkeypatch.setattr(dag, "factor", lambda node: calls.append(node) or factor(node))
+    evidence = make_fake_df(7, rows=50, seed=3)[["a", "d", "f"]].astype(float)
+    evidence.iloc[::3, 0] = float("nan")
+    Query(dag).infer_many(evidence, targets=["c", "g"], max_cells=max_cells)
+    assert sorted(calls) == sorted(dag.nodes)
+
+
+def test_infer_many_single_target_and_errors(simple_dag):
+    evidence = pd.DataFrame({"a": [0, 1, 1]})
+    result = Query(simple_dag).infer_many(evidence, targets="b")
+    assert result.shape == (3, 2)
+    assert result[1, 1] == pytest.approx(0.5, abs=0.0001)
+    with pytest.raises(ValueError):
+        Query(simple_dag).given(a=1).infer_many(evidence, targets="b")
+    with pytest.raises(ValueError):
+        Query(simple_dag).infer_many(pd.DataFrame({"a": [3]}), targets="b")
+
+
+def test_inference_dag_reuses_tables(dag):
+    dag = dag.cache()
+    infer_dag = Query(dag).given(a=1).do(c=0).inference_dag()
+    assert infer_dag.df is dag.df
+    assert infer_dag.parents("c") == set()
+    assert infer_dag.factor("f") is dag.factor("f")
+    assert infer_dag.factor("c").to_frame(drop_zeros=True)["c"].tolist() == [0]
+    expected = Query(dag).given(a=1).do(c=0).infer()
+    result = Query(infer_dag).given(a=1).infer()
+    for node, probs in expected.items():
+        for value, prob in probs.items():
+            assert result[node][value] == pytest.approx(prob, abs=0.0001)
+
+
+def test_inference_dag_without_dataframe():
+    chunks = [make_fake_df(4, rows=100, seed=i) for i in range(3)]
+    dag = DAG.from_chunks(chunks, edges=[("a", "b"), ("b", "c")])
+    infer_dag = Query(dag).do(b=1).inference_dag()
+    assert infer_dag.df is None
+    assert infer_dag.edges == [("b", "c")]
+    assert infer_dag.marginal_table["prob"].sum() == pytest.approx(1.0, abs=0.0001)
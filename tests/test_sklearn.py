@@ -1,7 +1,9 @@
 import pytest
+import pandas as pd
 
-from brent.sklearn import BrentClassifier
+from brent.sklearn import BrentClassifier, BrentImputer
 from brent.graph import DAG
+from brent.query import Query
 from brent.common import make_fake_df
 
 
@@ -40,3 +42,82 @@ def test_can_make_prediction_2(dag_with_four_values):
     mod = BrentClassifier(dag=dag_with_four_values, to_predict="c")
     assert mod.fit(df, df['c']).predict_proba(df[:4]).shape == (4, 4)
     assert mod.fit(df, df['c']).predict_proba(df[:15]).shape == (15, 4)
+
+
+def test_predict_proba_matches_query(dag_with_four_values):
+    df = make_fake_df(nodes=4, rows=2000, values=4)
+    mod = BrentClassifier(dag=dag_with_four_values, to_predict="b").fit(df, df['b'])
+    assert set(mod.blanket_) == {"a", "c", "d"}
+    probs = mod.predict_proba(df[:10])
+    for i, row in df[:10].reset_index(drop=True).iterrows():
+        expected = Query(dag_with_four_values, given={k: v for k, v in row.items() if k != "b"}).infer()["b"]
+        for j, label in enumerate(mod.classes_):
+            assert probs[i, j] == pytest.approx(expected.get(label, 0.0), abs=0.0001)
+
+
+def test_predict_uses_class_labels():
+    df = pd.DataFrame({"a": ["x", "x", "y", "y"], "b": ["lo", "hi", "hi", "hi"]})
+    mod = BrentClassifier(dag=DAG(df).add_edge("a", "b"), to_predict="b").fit(df, df["b"])
+    assert list(mod.classes_) == ["hi", "lo"]
+    assert list(mod.predict(pd.DataFrame({"a": ["x", "y"], "b": ["lo", "lo"]}))) == ["hi", "hi"]
+    assert mod.predict_proba(df).shape == (4, 2)
+
+
+def test_classes_follow_domain_at_fit():
+    df = pd.DataFrame({"a": ["x", "x", "y", "y"], "b": ["lo", "hi", "hi", "hi"]})
+    dag = DAG(df).add_edge("a", "b")
+    mod = BrentClassifier(dag=dag, to_predict="b")
+    dag.partial_fit(pd.DataFrame({"a": ["z"], "b": ["mid"]}))
+    mod.fit(df, df["b"])
+    assert list(mod.classes_) == ["hi", "lo", "mid"]
+    assert mod.predict_proba(pd.DataFrame({"a": ["z"], "b": ["lo"]})).shape == (1, 3)
+    assert list(mod.predict(pd.DataFrame({"a": ["z"], "b": ["lo"]}))) == ["mid"]
+
+
+def test_predict_proba_after_domain_grows_in_front():
+    df = pd.DataFrame({"a": ["x", "x", "y", "y"], "b": ["lo", "hi", "lo", "lo"]})
+    dag = DAG(df).add_edge("a", "b")
+    mod = BrentClassifier(dag=dag, to_predict="b").fit(df, df["b"])
+    expected = mod.predict_proba(df)
+    dag.partial_fit(pd.DataFrame({"a": ["w"], "b": ["hi"]}))
+    assert dag.domains["a"] == ("w", "x", "y")
+    assert mod.predict_proba(df).tolist() == expected.tolist()
+    with pytest.raises(ValueError):
+        mod.predict_proba(pd.DataFrame({"a": ["w"], "b": ["hi"]}))
+
+
+@pytest.mark.parametrize("method", ["map", "sample"])
+def test_imputer_fills_missing_values(dag_with_two_values, method):
+    df = make_fake_df(nodes=4, rows=40).astype(float)
+    df.iloc[::3, 1] = float("nan")
+    df.iloc[::5, 3] = float("nan")
+    result = BrentImputer(dag_with_two_values, method=method, random_state=42).fit_transform(df)
+    assert result.isna().sum().sum() == 0
+    assert (result[df.notna()] == df[df.notna()]).sum().sum() == df.notna().sum().sum()
+    assert set(result["b"]).issubset({0, 1})
+
+
+def test_imputer_map_matches_query(dag_with_two_values):
+    df = make_fake_df(nodes=4, rows=20).astype(float)
+    df.iloc[::2, 0] = float("nan")
+    result = BrentImputer(dag_with_two_values).fit_transform(df)
+    for i in range(0, 20, 2):
+        given = {k: v for k, v in df.iloc[i].items() if k != "a"}
+        posterior = Query(dag_with_two_values, given=given).infer(targets=["a"])["a"]
+        assert posterior[result.loc[i, "a"]] == max(posterior.values())
+
+
+def test_imputer_bad_method(dag_with_two_values):
+    with pytest.raises(ValueError):
+        BrentImputer(dag_with_two_values, method="mean")
+
+
+def test_imputer_counts_tables_once(dag_with_two_values, monkeypatch):
+    calls = []
+    factor = dag_with_two_values.factor
+    monkeypatch.setattr(dag_with_two_values, "factor", lambda node: calls.append(node) or factor(node))
+    df = make_fake_df(nodes=4, rows=40).astype(float)
+    df.iloc[::3, 1] = float("nan")
+    df.iloc[::5, 3] = float("nan")
+    BrentImputer(dag_with_two_values).fit_transform(df)
+    assert sorted(calls) == sorted(dag_with_two_values.nodes)
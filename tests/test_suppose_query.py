@@ -47,3 +47,56 @@ def test_empty_when_equals_query(simple_dag):
     q2 = Query(dag=simple_dag).given(b=1)
     s = SupposeQuery(dag=simple_dag).when(q1).suppose_given(b=1)
     assert q2.infer() == s.infer()
+
+
+def test_abduction_conditions_tables_on_when(simple_dag):
+    s = SupposeQuery(dag=simple_dag).when(Query(dag=simple_dag).given(b=1))
+    table = Query(dag=simple_dag).given(b=1).infer(give_table=True)
+    expected = table.groupby("a")["prob"].sum()
+    abducted = s.abducted_dag().factor("a").to_frame().set_index("a")["prob"]
+    for value, prob in expected.items():
+        assert abducted[value] == pytest.approx(prob, abs=0.0001)
+    assert (s.abducted_dag().factor("b").values == simple_dag.factor("b").values).all()
+
+
+def test_abduction_follows_partial_fit(simple_dag):
+    s = SupposeQuery(dag=simple_dag).when(Query(dag=simple_dag).given(b=1)).suppose_do(c=0)
+    before = s.infer()
+    assert s.abducted_dag() is s.abducted_dag()
+    simple_dag.partial_fit(pd.DataFrame({"a": [1] * 20, "b": [1] * 20, "c": [1] * 20}))
+    fresh = SupposeQuery(dag=simple_dag).when(Query(dag=simple_dag).given(b=1)).suppose_do(c=0).infer()
+    assert s.infer() == fresh
+    assert s.infer() != before
+
+
+def test_infer_many_matches_infer(simple_dag):
+    s = SupposeQuery(dag=simple_dag).when(Query(dag=simple_dag).given(b=1))
+    scenarios = [{"do": {"a": 0}}, {"do": {"a": 1}, "given": {"c": 0}}, {}]
+    results = s.infer_many(scenarios)
+    assert results[0] == s.suppose_do(a=0).infer()
+    assert results[1] == s.suppose_do(a=1).suppose_given(c=0).infer()
+    assert results[2] == s.infer()
+    with pytest.raises(ValueError):
+        s.infer_many([{"when": {"a": 1}}])
+
+
+def test_infer_many_compiled_dag(simple_dag):
+    scenarios = [{"do": {"c": 0}}, {"given": {"a": 1}}]
+    expected = SupposeQuery(dag=simple_dag).when(Query(dag=simple_dag).given(b=1)).infer_many(scenarios)
+    dag = simple_dag.copy().compile()
+    results = SupposeQuery(dag=dag).when(Query(dag=dag).given(b=1)).infer_many(scenarios)
+    for result, exp in zip(results, expected):
+        for node, probs in exp.items():
+            for value, prob in probs.items():
+                assert result[node][value] == pytest.approx(prob, abs=0.0001)
+
+
+def test_queries_without_dataframe(simple_dag):
+    dag = DAG.from_cpts(simple_dag.edges, {n: simple_dag.calc_node_table(n) for n in simple_dag.nodes})
+    assert Query(dag).given(b=1).do(c=0).infer() == Query(simple_dag).given(b=1).do(c=0).infer()
+    expected = SupposeQuery(simple_dag).when(Query(simple_dag).given(b=1)).suppose_do(a=0).infer()
+    result = SupposeQuery(dag).when(Query(dag).given(b=1)).suppose_do(a=0).infer()
+    for node, probs in expected.items():
+        for value, prob in probs.items():
+            assert result[node][value] == pytest.approx(prob, abs=0.0001)
+    assert len(Query(dag).given(a=1).sample(10, random_state=0)) == 10
@@ -0,0 +1,80 @@
+import io
+
+import pytest
+
+from brent import parsers, DAG, Query
+from brent.common import make_fake_df
+
+
+@pytest.fixture
+def test_xmlbif():
+    return """<?xml version="1.0"?>
+<BIF VERSION="0.3">
+<NETWORK>
+<NAME>dog-problem</NAME>
+<VARIABLE TYPE="nature">
+  <NAME>family-out</NAME>
+  <OUTCOME>true</OUTCOME>
+  <OUTCOME>false</OUTCOME>
+</VARIABLE>
+<VARIABLE TYPE="nature">
+  <NAME>bowel-problem</NAME>
+  <OUTCOME>true</OUTCOME>
+  <OUTCOME>false</OUTCOME>
+</VARIABLE>
+<VARIABLE TYPE="nature">
+  <NAME>dog-out</NAME>
+  <OUTCOME>true</OUTCOME>
+  <OUTCOME>false</OUTCOME>
+</VARIABLE>
+<DEFINITION>
+  <FOR>family-out</FOR>
+  <TABLE>0.15 0.85 </TABLE>
+</DEFINITION>
+<DEFINITION>
+  <FOR>bowel-problem</FOR>
+  <TABLE>0.01 0.99 </TABLE>
+</DEFINITION>
+<DEFINITION>
+  <FOR>dog-out</FOR>
+  <GIVEN>bowel-problem</GIVEN>
+  <GIVEN>family-out</GIVEN>
+  <TABLE>0.99 0.01 0.97 0.03 0.9 0.1 0.3 0.7 </TABLE>
+</DEFINITION>
+</NETWORK>
+</BIF>
+"""
+
+
+def test_xmlbif_factors(test_xmlbif):
+    factors, links = parsers.xmlbif_factors(io.StringIO(test_xmlbif))
+    assert list(factors.keys()) == ["family-out", "bowel-problem", "dog-out"]
+    assert sorted(links) == [("bowel-problem", "dog-out"), ("family-out", "dog-out")]
+    assert factors["dog-out"].variables == ("bowel-problem", "family-out", "dog-out")
+    assert factors["dog-out"].values[1, 0].tolist() == [0.9, 0.1]
+
+
+def test_xmlbif_factors_takes_same_input_as_bif_factors(test_xmlbif):
+    factors, links = parsers.xmlbif_factors(test_xmlbif)
+    expected, expected_links = parsers.xmlbif_factors(io.StringIO(test_xmlbif))
+    assert links == expected_links
+    assert factors["dog-out"].values.tolist() == expected["dog-out"].values.tolist()
+
+
+def test_xmlbif_wrong_table_size(test_xmlbif):
+    with pytest.raises(ValueError):
+        parsers.xmlbif_factors(io.StringIO(test_xmlbif.replace("0.3 0.7 </TABLE>", "</TABLE>")))
+
+
+def test_write_xmlbif_roundtrip(tmp_path):
+    dag = DAG(make_fake_df(4, values=3)).add_edge("a", "b").add_edge("c", "b").add_edge("b", "d").cache()
+    parsers.write_xmlbif(dag, str(tmp_path / "model.xml"))
+    with open(tmp_path / "model.xml") as f:
+        factors, links = parsers.xmlbif_factors(f)
+    loaded = DAG.from_cpts(links, factors)
+    assert loaded.domains["b"] == ("0", "1", "2")
+    result = Query(loaded).given(d="1").infer()
+    expected = Query(dag).given(d=1).infer()
+    for node in ["a", "b", "c"]:
+        for value, prob in expected[node].items():
+            assert result[node][str(value)] == pytest.approx(prob, abs=1e-9)